@@ -0,0 +1,92 @@
+"""Resolve coordinates for all events that only have a text address.
+
+Run offline (e.g. from cron) so that map and nearby views never need to
+geocode while a user waits::
+
+    python -m invevent.backfill_geocode --batch-size 100 --rps 1
+
+Events are walked in primary-key order in batches. Progress is the data
+itself: every resolved event gets its coordinates written back, and every
+address Nominatim does not know lands in the negative geocoding cache, so an
+interrupted run simply resumes with the remaining rows on the next start and
+cached answers do not count against the request budget.
+"""
+import argparse
+import logging
+import time
+
+from sqlalchemy import select
+
+from .config import GEOCODE_BACKFILL_RPS
+from .database import SessionLocal
+from .models import Event
+from .geocoding import lookup_cached, geocode_uncached, save_event_coords
+
+log = logging.getLogger(__name__)
+
+
+def _pending_batch(after_id: str, size: int):
+    with SessionLocal() as db:
+        return db.execute(
+            select(Event.id, Event.address)
+            .where(
+                Event.address.is_not(None),
+                Event.address != "",
+                Event.latitude.is_(None),
+                Event.id > after_id,
+            )
+            .order_by(Event.id)
+            .limit(size)
+        ).all()
+
+
+def backfill(batch_size: int = 100, rps: float = GEOCODE_BACKFILL_RPS, limit: int = 0) -> dict:
+    """Geocode pending events; return counters of the run.
+
+    ``rps`` caps requests actually sent to Nominatim, ``limit`` (if > 0)
+    stops after that many events.
+    """
+    interval = 1.0 / rps if rps > 0 else 0.0
+    last_request = 0.0
+    done = {"events": 0, "resolved": 0, "unresolved": 0, "requests": 0}
+    after_id = ""
+    while True:
+        rows = _pending_batch(after_id, batch_size)
+        if not rows:
+            break
+        for eid, address in rows:
+            after_id = eid
+            hit, coords = lookup_cached(address)
+            if not hit:
+                wait = last_request + interval - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                last_request = time.monotonic()
+                done["requests"] += 1
+                coords = geocode_uncached(address)
+            if coords:
+                save_event_coords(eid, *coords)
+                done["resolved"] += 1
+            else:
+                done["unresolved"] += 1
+            done["events"] += 1
+            if limit and done["events"] >= limit:
+                return done
+        log.info("Backfill progress: %s", done)
+    return done
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--rps", type=float, default=GEOCODE_BACKFILL_RPS,
+                        help="max Nominatim requests per second")
+    parser.add_argument("--limit", type=int, default=0, help="stop after N events (0 = all)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    result = backfill(args.batch_size, args.rps, args.limit)
+    log.info("Backfill finished: %s", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Micro-benchmark: telebot predicate scanning vs. the ``Router`` lookup table.
+
+    python -m invevent.benchmarks.dispatch [--handlers 10 100 1000]
+
+Each bot gets ``n`` state-dependent button handlers; the message hits the
+last registered button, which is the worst case for a linear scan.
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+from telebot import TeleBot, types  # noqa: E402
+
+from ..router import Router  # noqa: E402
+
+STATE = {1: "menu"}
+
+
+def _message(text: str):
+    return types.Message.de_json({
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "Bench"},
+        "text": text,
+    })
+
+
+def _linear_bot(n: int) -> TeleBot:
+    bot = TeleBot("1:benchmark", threaded=False)
+    for i in range(n):
+        bot.message_handler(
+            func=lambda m, t=f"button {i}": STATE.get(m.from_user.id) == "menu" and m.text == t
+        )(lambda m: None)
+    return bot
+
+
+def _router_bot(n: int) -> TeleBot:
+    bot = TeleBot("1:benchmark", threaded=False)
+    router = Router()
+    for i in range(n):
+        router.message(f"button {i}", states=("menu",))(lambda m: None)
+    router.install(bot, STATE.get)
+    return bot
+
+
+def _per_message(bot: TeleBot, msg, count: int) -> float:
+    batch = [msg]
+    t0 = time.perf_counter()
+    for _ in range(count):
+        bot.process_new_messages(batch)
+    return (time.perf_counter() - t0) / count
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="message dispatch benchmark")
+    parser.add_argument("--handlers", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    print(f"{'handlers':>10} {'linear us':>10} {'router us':>10} {'speedup':>8}")
+    for n in args.handlers:
+        msg = _message(f"button {n - 1}")
+        t_linear = _per_message(_linear_bot(n), msg, args.messages)
+        t_router = _per_message(_router_bot(n), msg, args.messages)
+        print(f"{n:>10} {t_linear * 1e6:>10.1f} {t_router * 1e6:>10.1f} {t_linear / t_router:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Micro-benchmark: scalar ``_haversine`` loop vs. vectorized ``haversine_many``.
+
+    python -m invevent.benchmarks.distance [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+from .. import map_view  # noqa: E402
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="distance filtering benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if map_view.np is None:
+        print("NumPy is not installed; only the scalar path is available.")
+    user_lat, user_lon = 55.75, 37.62
+    print(f"{'points':>10} {'scalar ms':>10} {'numpy ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        rnd = random.Random(n)
+        lats = [rnd.uniform(54.0, 57.5) for _ in range(n)]
+        lons = [rnd.uniform(35.0, 40.0) for _ in range(n)]
+
+        def scalar():
+            return [i for i, (lat, lon) in enumerate(zip(lats, lons))
+                    if map_view._haversine(user_lat, user_lon, lat, lon) <= map_view.NEARBY_KM]
+
+        def vectorized():
+            dist = map_view.haversine_many(user_lat, user_lon, lats, lons)
+            return (dist <= map_view.NEARBY_KM).nonzero()[0]
+
+        t_scalar = _time(scalar, args.repeat)
+        if map_view.np is None:
+            print(f"{n:>10} {t_scalar * 1000:>10.1f} {'-':>10} {'-':>8}")
+            continue
+        assert len(scalar()) == len(vectorized())
+        t_vec = _time(vectorized, args.repeat)
+        print(f"{n:>10} {t_scalar * 1000:>10.1f} {t_vec * 1000:>10.1f} {t_scalar / t_vec:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark: a join storm on one event — naive insert vs. upsert vs. write-behind.
+
+    python -m invevent.benchmarks.joins [--joins 5000] [--threads 32] [--dup 0.2]
+
+Every mode joins the same number of users to a fresh event from many
+threads; ``--dup`` of the taps are repeats (double taps). The naive mode is
+the former ``db.add(Participation(...)); db.commit()``.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+os.environ.setdefault("DB_URL", f"sqlite:///{tempfile.mkdtemp(prefix='invevent-bench-')}/joins.db")
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.exc import IntegrityError, OperationalError  # noqa: E402
+
+from ..database import Base, SessionLocal, engine  # noqa: E402
+from ..models import Participation  # noqa: E402
+from .. import participation  # noqa: E402
+
+
+def _storm(name, join_one, taps, threads, finish=lambda: None):
+    errors = {"integrity": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def tap(pair):
+        try:
+            join_one(*pair)
+        except IntegrityError:
+            with lock:
+                errors["integrity"] += 1
+        except OperationalError:
+            with lock:
+                errors["locked"] += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(tap, taps))
+    finish()
+    elapsed = time.perf_counter() - t0
+    eid = taps[0][0]
+    with SessionLocal() as db:
+        rows = db.scalar(select(func.count()).select_from(Participation).where(Participation.event_id == eid))
+    print(f"{name:>12} {elapsed:>8.2f} {len(taps) / elapsed:>10.0f} {rows:>8} {errors['integrity']:>10} {errors['locked']:>7}")
+
+
+def _naive(event_id, user_id):
+    with SessionLocal() as db:
+        db.add(Participation(event_id=event_id, user_id=user_id))
+        db.commit()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="participation join-storm benchmark")
+    parser.add_argument("--joins", type=int, default=5000, help="distinct users joining")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--dup", type=float, default=0.2, help="share of repeated taps")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(engine)
+    rnd = random.Random(1)
+    users = list(range(1, args.joins + 1))
+
+    def taps(event_id):
+        pairs = [(event_id, u) for u in users]
+        pairs += [(event_id, rnd.choice(users)) for _ in range(int(args.joins * args.dup))]
+        rnd.shuffle(pairs)
+        return pairs
+
+    print(f"{engine.url.drivername}: {args.joins} users, {args.threads} threads")
+    print(f"{'mode':>12} {'seconds':>8} {'taps/s':>10} {'rows':>8} {'integrity':>10} {'locked':>7}")
+    _storm("naive", _naive, taps("bench-naive"), args.threads)
+    _storm("upsert", participation.join, taps("bench-upsert"), args.threads)
+    buffer = participation.JoinBuffer()
+    _storm("write-behind", buffer.add, taps("bench-buffer"), args.threads, finish=buffer.stop)
+
+
+if __name__ == "__main__":
+    main()
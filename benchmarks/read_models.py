@@ -0,0 +1,107 @@
+"""Benchmark: loading an event list as ORM entities vs. projected ``EventRow``s.
+
+    python -m invevent.benchmarks.read_models [--sizes 10000 50000] [--repeat 3]
+
+Both modes read the same active events (each with a realistic description)
+from a scratch SQLite file. Time is the best of ``--repeat`` runs; memory is
+measured with tracemalloc on a separate run. "peak" is the allocation
+high-water mark during the query, "kept" is what the returned list holds on
+to.
+"""
+import argparse
+import functools
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+from sqlalchemy import insert, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from ..database import Base, make_engine  # noqa: E402
+from ..models import Event, EventState, EventVisibility  # noqa: E402
+from ..read_models import event_rows, event_rows_stmt  # noqa: E402
+
+DESCRIPTION = "Bring a friend, snacks and good mood. " * 12
+
+
+def _seed(Session, n: int) -> None:
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "id": str(uuid.uuid4()), "owner_id": i % 500, "title": f"event {i}", "description": DESCRIPTION,
+            "datetime_utc": now + timedelta(seconds=i), "location_txt": "Somewhere nice",
+            "visibility": EventVisibility.Public, "tags": "sport,outdoor", "state": EventState.Active,
+            "latitude": 55.7 + i % 100 / 1000, "longitude": 37.6, "address": None,
+        }
+        for i in range(n)
+    ]
+    with Session() as db:
+        db.execute(insert(Event), rows)
+        db.commit()
+
+
+def _orm(Session):
+    with Session() as db:
+        return db.scalars(select(Event).where(Event.state == EventState.Active)).all()
+
+
+def _projected(Session):
+    with Session() as db:
+        return event_rows(db, event_rows_stmt().where(Event.state == EventState.Active))
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _memory(fn):
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    gc.collect()
+    kept = tracemalloc.get_traced_memory()[0]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak, kept
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="event list read model benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    mb = 1024 * 1024
+    print(f"{'rows':>8} {'mode':>10} {'ms':>8} {'peak MB':>8} {'kept MB':>8}")
+    for n in args.sizes:
+        path = os.path.join(tempfile.mkdtemp(prefix="invevent-bench-"), "rows.db")
+        engine = make_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, expire_on_commit=False)
+        _seed(Session, n)
+        results = {}
+        for name, fn in (("orm", _orm), ("projected", _projected)):
+            load = functools.partial(fn, Session)
+            seconds = _best(load, args.repeat)
+            peak, kept = _memory(load)
+            results[name] = seconds
+            print(f"{n:>8} {name:>10} {seconds * 1000:>8.0f} {peak / mb:>8.1f} {kept / mb:>8.1f}")
+        print(f"{'':>8} {'speedup':>10} {results['orm'] / results['projected']:>7.1f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
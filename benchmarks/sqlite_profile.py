@@ -0,0 +1,103 @@
+"""Benchmark: concurrent reads and writes on SQLite, default engine vs. tuned profile.
+
+    python -m invevent.benchmarks.sqlite_profile [--seconds 5] [--readers 8] [--writers 4]
+
+Readers run the "events today" query and writers insert events in small
+transactions, all at once, against a fresh database file per profile. Lock
+errors count statements that failed with "database is locked".
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from ..database import Base, make_engine  # noqa: E402
+from ..models import Event, EventState, EventVisibility  # noqa: E402
+
+
+def _event(owner_id: int, when: datetime) -> Event:
+    return Event(
+        id=str(uuid.uuid4()), owner_id=owner_id, title="bench", description="",
+        datetime_utc=when, location_txt="", visibility=EventVisibility.Public, tags="",
+    )
+
+
+def _run(tuned: bool, seconds: float, readers: int, writers: int, seed_rows: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="invevent-bench-"), "profile.db")
+    engine = make_engine(f"sqlite:///{path}", tuned=tuned)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    Base.metadata.create_all(engine)
+    now = datetime.now(timezone.utc)
+    with Session() as db:
+        db.add_all(_event(i % 500, now + timedelta(minutes=i % 2000)) for i in range(seed_rows))
+        db.commit()
+
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+    start, end = now, now + timedelta(days=1)
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with Session() as db:
+                    db.scalars(select(Event).where(
+                        Event.state == EventState.Active,
+                        Event.datetime_utc >= start, Event.datetime_utc < end,
+                    ).limit(50)).all()
+                bump("reads")
+            except OperationalError:
+                bump("locked")
+
+    def writer(n):
+        while not stop.is_set():
+            try:
+                with Session() as db:
+                    db.add(_event(n, now + timedelta(hours=1)))
+                    db.commit()
+                bump("writes")
+            except OperationalError:
+                bump("locked")
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    return {k: v / seconds if k != "locked" else v for k, v in counts.items()}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="SQLite engine profile benchmark")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=20_000, help="events seeded before the run")
+    args = parser.parse_args(argv)
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g}s, {args.rows} seeded events")
+    print(f"{'profile':>8} {'reads/s':>9} {'writes/s':>9} {'locked':>7}")
+    for name, tuned in (("default", False), ("tuned", True)):
+        r = _run(tuned, args.seconds, args.readers, args.writers, args.rows)
+        print(f"{name:>8} {r['reads']:>9.0f} {r['writes']:>9.0f} {r['locked']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
 
 import logging
-from telebot import TeleBot, types
+from telebot import types
 from .callbacks import register_callbacks
-from .config import BOT_TOKEN, ADMIN_CHAT_ID
-from .database import Base, engine
+from .config import BOT_TOKEN, ADMIN_CHAT_ID, WEBHOOK_URL
+from .database import engine
+from .migrations import upgrade
 from .menus import register_menu
+from .menus.state import get_state
 from .wizard.wizard_start import register_start
 from .wizard.wizard_dispatcher import register_dispatcher
+from . import render_pool, event_counters, feed, participation
+from .dispatcher import DispatchingTeleBot
+from .outbox import OutboxMixin
+from .router import ROUTER
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,8 +22,11 @@ logging.basicConfig(
 )
 log=logging.getLogger("invevent")
 
-bot=TeleBot(BOT_TOKEN,parse_mode="HTML")
-Base.metadata.create_all(engine)
+class Bot(OutboxMixin, DispatchingTeleBot):
+    """Updates in on per-user lanes, messages out through the rate-limited outbox."""
+
+bot=Bot(BOT_TOKEN,parse_mode="HTML")
+upgrade(engine)
 
 MAIN_KB=types.ReplyKeyboardMarkup(resize_keyboard=True,row_width=2)
 MAIN_KB.add(
@@ -31,16 +40,40 @@ register_menu(bot)
 register_start(bot)
 register_dispatcher(bot)
 register_callbacks(bot)
-
-if ADMIN_CHAT_ID:
-    try:
-        bot.send_message(ADMIN_CHAT_ID, "Bot started")
-    except Exception as e:
-        log.warning("Failed to notify startup: %s", e)
+ROUTER.install(bot,get_state)
 
 def main():
-    log.info("Polling...")
-    bot.infinity_polling(skip_pending=True,timeout=30)
+    # fork the render workers first; every other thread starts after them
+    render_pool.start()
+    bot.dispatcher.start()
+    if bot.outbox is not None:
+        bot.outbox.start()
+    participation.start()
+    event_counters.start()
+    feed.start()
+    if ADMIN_CHAT_ID:
+        try:
+            bot.send_message(ADMIN_CHAT_ID, "Bot started")
+        except Exception as e:
+            log.warning("Failed to notify startup: %s", e)
+    try:
+        if WEBHOOK_URL:
+            from .webhook import run_webhook
+            log.info("Webhook mode: %s", WEBHOOK_URL)
+            run_webhook(bot)
+        else:
+            log.info("Polling...")
+            bot.remove_webhook()
+            bot.infinity_polling(skip_pending=True,timeout=30)
+    finally:
+        if not bot.dispatcher.drain():
+            log.warning("Update lanes not drained in time: %s", bot.dispatcher.stats())
+        participation.stop()
+        feed.stop()
+        render_pool.shutdown()
+        if bot.outbox is not None and not bot.outbox.stop():
+            log.warning("Outbox not flushed in time: %s", bot.outbox.stats())
+        event_counters.stop()
 
 if __name__=="__main__":
     main()
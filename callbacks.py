@@ -2,22 +2,42 @@
 from telebot import types
 from sqlalchemy import select
 from .database import SessionLocal
-from .models import Event, Participation, EventState
+from .models import Event, EventState
 from .helpers import cb
+from .map_view import MAP_CTX, cluster_keyboard
+from .router import ROUTER
+from .event_cards import get_card
+from .participation import record_join, is_joined, leave
 
 def register_callbacks(bot):
-    @bot.callback_query_handler(func=lambda c: c.data.startswith("evt:"))
+    @ROUTER.callback("evt")
     def evt_cb(c):
         _, eid, _, verb = c.data.split(":")
+        if verb in ("details","summary"):
+            card=get_card(eid)
+            if not card:
+                bot.answer_callback_query(c.id,"Not found"); return
+            if verb=="details":
+                bot.answer_callback_query(c.id); bot.send_message(c.message.chat.id,card.details,parse_mode="HTML")
+                return
+            kb=types.InlineKeyboardMarkup(row_width=2)
+            kb.add(types.InlineKeyboardButton("Details",callback_data=cb(eid,"details")))
+            if c.from_user.id==card.owner_id:
+                kb.add(types.InlineKeyboardButton("Unjoin",callback_data=cb(eid,"unjoin")))
+            else:
+                if is_joined(eid,c.from_user.id):
+                    kb.add(types.InlineKeyboardButton("Unjoin",callback_data=cb(eid,"unjoin")))
+                else:
+                    kb.add(types.InlineKeyboardButton("Join",callback_data=cb(eid,"join")))
+            bot.answer_callback_query(c.id)
+            bot.send_message(c.message.chat.id,card.summary,parse_mode="HTML",reply_markup=kb)
+            return
         with SessionLocal() as db:
             ev = db.get(Event, eid)
             if not ev:
                 bot.answer_callback_query(c.id,"Not found"); return
-            if verb=="details":
-                text=(f"<b>{ev.title}</b>\n{ev.description}\n\n🗓️ {ev.datetime_utc:%Y-%m-%d %H:%M UTC}\n📍{ev.location_txt}")
-                bot.answer_callback_query(c.id); bot.send_message(c.message.chat.id,text,parse_mode="HTML")
-            elif verb=="join":
-                db.add(Participation(event_id=eid,user_id=c.from_user.id)); db.commit()
+            if verb=="join":
+                record_join(eid,c.from_user.id)
                 bot.answer_callback_query(c.id,"Joined!")
             elif verb=="unjoin":
                 if ev.owner_id==c.from_user.id:
@@ -25,24 +45,32 @@ def register_callbacks(bot):
                     db.commit()
                     bot.answer_callback_query(c.id,"Deleted")
                 else:
-                    part=db.get(Participation,{"event_id":eid,"user_id":c.from_user.id})
-                    if part:
-                        db.delete(part)
-                        db.commit()
+                    leave(eid,c.from_user.id)
                     bot.answer_callback_query(c.id,"Unjoined!")
-            elif verb=="summary":
-                part=db.get(Participation,{"event_id":eid,"user_id":c.from_user.id})
-                kb=types.InlineKeyboardMarkup(row_width=2)
-                kb.add(types.InlineKeyboardButton("Details",callback_data=cb(eid,"details")))
-                if c.from_user.id==ev.owner_id:
-                    kb.add(types.InlineKeyboardButton("Unjoin",callback_data=cb(eid,"unjoin")))
-                else:
-                    if part:
-                        kb.add(types.InlineKeyboardButton("Unjoin",callback_data=cb(eid,"unjoin")))
-                    else:
-                        kb.add(types.InlineKeyboardButton("Join",callback_data=cb(eid,"join")))
-                text=(f"<b>{ev.title}</b>\n"
-                      f"🗓️ {ev.datetime_utc:%Y-%m-%d %H:%M UTC}\n"
-                      f"📍{ev.location_txt}")
-                bot.answer_callback_query(c.id)
-                bot.send_message(c.message.chat.id,text,parse_mode="HTML",reply_markup=kb)
+
+    @ROUTER.callback("mapp")
+    def map_page_cb(c):
+        _, token, page = c.data.split(":")
+        kb = cluster_keyboard(token, int(page))
+        if kb is None:
+            bot.answer_callback_query(c.id, "This map has expired, please open it again.")
+            return
+        bot.answer_callback_query(c.id)
+        bot.edit_message_reply_markup(c.message.chat.id, c.message.message_id, reply_markup=kb)
+
+    @ROUTER.callback("mapc")
+    def map_cluster_cb(c):
+        _, token, idx = c.data.split(":")
+        clusters = MAP_CTX.get(token)
+        if clusters is None or int(idx) >= len(clusters):
+            bot.answer_callback_query(c.id, "This map has expired, please open it again.")
+            return
+        kb = types.InlineKeyboardMarkup()
+        for eid, title in clusters[int(idx)]:
+            kb.add(types.InlineKeyboardButton(title, callback_data=cb(eid, "summary")))
+        bot.answer_callback_query(c.id)
+        bot.send_message(c.message.chat.id, f"<b>Events at marker {int(idx) + 1}:</b>", parse_mode="HTML", reply_markup=kb)
+
+    @ROUTER.callback("noop")
+    def noop_cb(c):
+        bot.answer_callback_query(c.id)
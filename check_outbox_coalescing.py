@@ -0,0 +1,86 @@
+"""Fail if the outbox merges a message that is later edited or deleted.
+
+Map renders send a "Rendering map…" placeholder and delete it once the map
+is ready, so the placeholder must be a message of its own. This check sends,
+through the real outbox and render pool against ``fake_telegram.FakeTelegram``,
+a plain text followed by two map renders back to back, then a header followed
+by a keyboard::
+
+    python -m invevent.check_outbox_coalescing
+
+Exits with status 1 unless the text and both placeholders went out as three
+separate messages, each placeholder was deleted once by its own message id,
+and the header and keyboard were still merged into one message.
+"""
+import os
+import sys
+import tempfile
+import threading
+
+_DB_DIR = tempfile.mkdtemp(prefix="invevent-outbox-")
+os.environ.setdefault("BOT_TOKEN", "1:check")
+os.environ["DB_URL"] = f"sqlite:///{_DB_DIR}/outbox.db"
+os.environ["MAP_RENDER_WORKERS"] = "2"
+os.environ.setdefault("OUTBOX_WORKERS", "4")
+
+import telebot  # noqa: E402
+from telebot import types  # noqa: E402
+
+from . import render_pool  # noqa: E402
+from .dispatcher import DispatchingTeleBot  # noqa: E402
+from .fake_telegram import FakeTelegram  # noqa: E402
+from .outbox import OutboxMixin  # noqa: E402
+
+CHAT = 7
+
+
+class _Bot(OutboxMixin, DispatchingTeleBot):
+    pass
+
+
+def run() -> list:
+    """Send the messages described above; return the recorded Bot API calls."""
+    tg = FakeTelegram()
+    telebot.apihelper.API_URL = tg.api_url
+    render_pool.start()
+    bot = _Bot(os.environ["BOT_TOKEN"])
+    if bot.outbox is None:
+        raise SystemExit("OUTBOX_WORKERS=0: nothing to check")
+    bot.outbox.start()
+    delivered = threading.Semaphore(0)
+    bot.send_message(CHAT, "(none)")
+    for _ in range(2):
+        render_pool.submit(bot, CHAT, pow, (2, 10), lambda _result: delivered.release())
+    for _ in range(2):
+        if not delivered.acquire(timeout=30):
+            raise SystemExit("map render did not finish")
+    kb = types.InlineKeyboardMarkup()
+    kb.add(types.InlineKeyboardButton("x", callback_data="x"))
+    bot.send_message(CHAT, "Header")
+    bot.send_message(CHAT, "Menu:", reply_markup=kb)
+    bot.outbox.flush()
+    bot.outbox.stop()
+    render_pool.shutdown()
+    tg.close()
+    return [(method, params) for method, params in tg.calls if method in ("sendMessage", "deleteMessage")]
+
+
+def main() -> int:
+    calls = run()
+    texts = [params.get("text") for method, params in calls if method == "sendMessage"]
+    deleted = [params.get("message_id") for method, params in calls if method == "deleteMessage"]
+    problems = []
+    if texts[:3] != ["(none)", "Rendering map…", "Rendering map…"]:
+        problems.append(f"text and placeholders not sent separately: {texts}")
+    if len(deleted) != 2 or len(set(deleted)) != 2:
+        problems.append(f"placeholders not deleted once each: message ids {deleted}")
+    if "Header\n\nMenu:" not in texts:
+        problems.append(f"header and keyboard were not merged: {texts}")
+    for line in problems:
+        print(line)
+    print(f"{len(texts)} messages sent, {len(deleted)} deleted: {'FAIL' if problems else 'ok'}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
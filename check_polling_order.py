@@ -0,0 +1,111 @@
+"""Fail if polling mode handles an update twice, drops one or reorders a user's.
+
+Runs a ``DispatchingTeleBot`` with a deliberately slow handler in polling
+mode against ``fake_telegram.FakeTelegram``, which serves numbered text
+updates of several users from ``getUpdates`` and honours ``offset`` the way
+Telegram does. Updates are pushed in waves while the bot polls::
+
+    python -m invevent.check_polling_order [--users 5] [--updates 20]
+
+Exits with status 1 unless every user's updates were handled exactly once
+and in order, including after a few more polls once everything was handled
+(``check_webhook_order`` covers webhook mode).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+_DB_DIR = tempfile.mkdtemp(prefix="invevent-polling-")
+os.environ.setdefault("BOT_TOKEN", "1:check")
+os.environ["DB_URL"] = f"sqlite:///{_DB_DIR}/polling.db"
+
+import telebot  # noqa: E402
+
+from .dispatcher import DispatchingTeleBot  # noqa: E402
+from .fake_telegram import FakeTelegram  # noqa: E402
+
+
+def _wait(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def run(users: int, updates: int, workers: int, delay: float, waves: int = 4) -> dict:
+    """Push ``updates`` numbered messages per user in ``waves``; return what the handler saw."""
+    tg = FakeTelegram()
+    telebot.apihelper.API_URL = tg.api_url
+    bot = DispatchingTeleBot(os.environ["BOT_TOKEN"], workers=workers, queue_size=workers * 4)
+    handled = defaultdict(list)
+    lock = threading.Lock()
+
+    @bot.message_handler(content_types=["text"])
+    def record(message):
+        with lock:
+            handled[message.from_user.id].append(int(message.text))
+        time.sleep(random.uniform(0, delay))
+
+    def total():
+        with lock:
+            return sum(len(v) for v in handled.values())
+
+    bot.dispatcher.start()
+    poller = threading.Thread(
+        target=bot.polling, kwargs={"non_stop": True, "interval": 0, "timeout": 1, "long_polling_timeout": 1},
+        daemon=True,
+    )
+    poller.start()
+    per_wave = -(-updates // waves)
+    for start in range(0, updates, per_wave):
+        for n in range(start, min(start + per_wave, updates)):
+            for uid in range(1, users + 1):
+                tg.push(tg.message(chat_id=uid, text=str(n), user_id=uid))
+        time.sleep(delay * 2)
+    complete = _wait(lambda: total() >= users * updates, 30)
+    # a few more polls: already handled updates must not come back
+    polls = tg.polls
+    _wait(lambda: tg.polls >= polls + 3, 5)
+    bot.stop_polling()
+    poller.join(5)
+    drained = bot.dispatcher.drain()
+    tg.close()
+    return {"handled": dict(handled), "complete": complete, "drained": drained, "polls": tg.polls}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--updates", type=int, default=20, help="updates per user")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--delay", type=float, default=0.01, help="max seconds per handled update")
+    args = parser.parse_args(argv)
+
+    result = run(args.users, args.updates, args.workers, args.delay)
+    want = list(range(args.updates))
+    problems = []
+    for uid in range(1, args.users + 1):
+        got = result["handled"].get(uid, [])
+        if got != want:
+            problems.append(f"user {uid}: handled {got}")
+    if not result["complete"]:
+        problems.append("not every update was handled in time")
+    if not result["drained"]:
+        problems.append("lanes not drained")
+    for line in problems:
+        print(line)
+    handled = sum(len(v) for v in result["handled"].values())
+    print(f"{args.users} users x {args.updates} updates, {handled} handled over {result['polls']} polls: "
+          f"{'FAIL' if problems else 'ok'}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Fail if any query of the events or friends menu is answered by a table scan.
+
+Runs every route of ``menus/events_menu.py`` and ``menus/friends_menu.py``
+against a scratch SQLite database and a local fake Telegram API, records
+each SQL statement the handlers execute and checks its
+``EXPLAIN QUERY PLAN``::
+
+    python -m invevent.check_query_plans [--verbose]
+
+Exits with status 1 and prints the offending statements when a plan contains
+a ``SCAN`` of a table or index. Run it after changing a menu query or the
+indexes in ``models.py``.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+_DB_DIR = tempfile.mkdtemp(prefix="invevent-plans-")
+os.environ.setdefault("BOT_TOKEN", "1:check")
+os.environ["DB_URL"] = f"sqlite:///{_DB_DIR}/plans.db"
+os.environ["STATE_BACKEND"] = "memory"
+os.environ["MAP_RENDER_WORKERS"] = "0"
+os.environ["OUTBOX_WORKERS"] = "0"
+os.environ.pop("ADMIN_CHAT_ID", None)
+
+import telebot  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from telebot import TeleBot  # noqa: E402
+from telebot.types import Update  # noqa: E402
+
+from .fake_telegram import FakeTelegram  # noqa: E402
+
+_TG = FakeTelegram()
+telebot.apihelper.API_URL = _TG.api_url
+
+from . import bot as app  # noqa: E402
+from .database import SessionLocal, engine  # noqa: E402
+from .helpers import ucb  # noqa: E402
+from .models import Event, EventState, EventVisibility, Friendship, Participation, User  # noqa: E402
+from .menus.events_menu import LAST_LOCATION  # noqa: E402
+from .menus.friends_menu import USER_CTX  # noqa: E402
+from .menus.state import set_state  # noqa: E402
+from .router import ANY, ROUTER  # noqa: E402
+
+MODULES = ("invevent.menus.events_menu", "invevent.menus.friends_menu")
+ME, FRIEND = 1, 2
+LOCATION = (55.75, 37.62)
+
+# callback prefix → sample callback data for the menus under test
+CALLBACKS = {
+    "frsel": f"frsel:{FRIEND}",
+    "user": ucb(FRIEND, "menu"),
+    "ppl": f"ppl:followers:{FRIEND - 1}",
+    "evp": "evp:a:n:plan-check",
+    "topic": "topic:6",
+}
+
+
+def _seed() -> None:
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as db:
+        db.merge(User(id=ME, first_name="Me"))
+        db.merge(User(id=FRIEND, first_name="Friend"))
+        db.merge(Friendship(follower_id=ME, followee_id=FRIEND))
+        db.merge(Friendship(follower_id=FRIEND, followee_id=ME))
+        db.merge(Event(
+            id="plan-check", owner_id=FRIEND, title="Check", description="",
+            datetime_utc=now + timedelta(hours=1), location_txt="",
+            visibility=EventVisibility.Public, tags="sport", state=EventState.Active,
+        ))
+        db.merge(Participation(event_id="plan-check", user_id=ME))
+        db.commit()
+
+
+def _updates():
+    """Yield (route label, state, update dict) for every menu route."""
+    for (state, text, ct), handler in ROUTER._routes.items():
+        if handler.__module__ not in MODULES:
+            continue
+        update = _TG.message(chat_id=ME, text=text if ct == "text" else None, user_id=ME)
+        if ct == "text" and text is None:
+            update["message"]["text"] = "anything"
+        elif ct == "location":
+            update["message"]["location"] = {"latitude": LOCATION[0], "longitude": LOCATION[1]}
+        yield f"{handler.__name__} ({state}, {text!r}, {ct})", state, update
+    for prefix, handler in ROUTER._callbacks.items():
+        if handler.__module__ not in MODULES:
+            continue
+        if prefix not in CALLBACKS:
+            raise SystemExit(f"No sample callback data for '{prefix}:'; add it to CALLBACKS")
+        yield f"{handler.__name__} ({prefix}:)", ANY, _TG.callback(chat_id=ME, data=CALLBACKS[prefix], user_id=ME)
+
+
+def collect():
+    """Run every menu route and return {label: [(statement, parameters), ...]}."""
+    statements = {}
+    current = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            current.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for label, state, update in _updates():
+            _seed()
+            set_state(ME, "main" if state == ANY else state)
+            LAST_LOCATION.set(ME, LOCATION)
+            USER_CTX.set(ME, {"id": FRIEND, "name": "Friend", "origin": "followers"})
+            current.clear()
+            TeleBot.process_new_updates(app.bot, [Update.de_json(json.dumps(update))])
+            statements[label] = list(current)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+
+def scans(statement: str, parameters):
+    """Return the ``SCAN`` lines of the query plan of ``statement``."""
+    raw = engine.raw_connection()
+    try:
+        rows = raw.cursor().execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    finally:
+        raw.close()
+    return [r[-1] for r in rows if r[-1].startswith("SCAN") and "CONSTANT ROW" not in r[-1]]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--verbose", action="store_true", help="print every checked statement")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    checked = 0
+    for label, statements in collect().items():
+        for statement, parameters in statements:
+            checked += 1
+            bad = scans(statement, parameters)
+            if bad or args.verbose:
+                print(f"{'SCAN' if bad else 'ok  '} {label}\n     {' '.join(statement.split())}")
+                for line in bad:
+                    print(f"     -> {line}")
+            failures += bool(bad)
+    print(f"{checked} statements checked, {failures} with table scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Fail if the webhook server reorders a user's updates or overruns its queues.
+
+Starts the webhook server of ``webhook.py`` on a free local port in front of
+a ``LaneDispatcher`` with few, small lanes and a deliberately slow handler.
+Then posts numbered text updates of several users from concurrent clients
+(``fake_telegram.FakeTelegram``), the way Telegram does: each user's updates
+one after another, a 503 retried until it is accepted::
+
+    python -m invevent.check_webhook_order [--users 8] [--updates 25]
+
+Exits with status 1 when a user's updates were handled out of order, an
+update was lost or handled twice, a lane held more than its share of the
+queue, or no update was ever rejected (the backpressure never kicked in).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+_DB_DIR = tempfile.mkdtemp(prefix="invevent-webhook-")
+os.environ.setdefault("BOT_TOKEN", "1:check")
+os.environ["DB_URL"] = f"sqlite:///{_DB_DIR}/webhook.db"
+
+from .dispatcher import LaneDispatcher  # noqa: E402
+from .fake_telegram import FakeTelegram  # noqa: E402
+from .webhook import make_server  # noqa: E402
+
+SECRET = "check"
+
+
+def run(users: int, updates: int, workers: int, queue_size: int, delay: float) -> dict:
+    """Post ``updates`` numbered messages per user; return what the handler saw."""
+    handled = defaultdict(list)
+    lock = threading.Lock()
+    depth = {"max": 0}
+
+    def handle(update):
+        msg = update.message
+        with lock:
+            handled[msg.from_user.id].append(int(msg.text))
+            depth["max"] = max(depth["max"], max(dispatcher.stats()["queued"]))
+        time.sleep(random.uniform(0, delay))
+
+    dispatcher = LaneDispatcher(handle, workers, queue_size)
+    server = make_server(dispatcher, host="127.0.0.1", port=0, secret=SECRET)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://%s:%s/" % server.server_address[:2]
+    tg = FakeTelegram()
+    dispatcher.start()
+    statuses = defaultdict(int)
+
+    def client(user_id):
+        for n in range(updates):
+            update = tg.message(chat_id=user_id, text=str(n), user_id=user_id)
+            while True:
+                status = tg.post(url, update, secret=SECRET)
+                with lock:
+                    statuses[status] += 1
+                if status != 503:
+                    break
+                time.sleep(0.01)
+
+    clients = [threading.Thread(target=client, args=(uid,)) for uid in range(1, users + 1)]
+    for t in clients:
+        t.start()
+    for t in clients:
+        t.join()
+    drained = dispatcher.drain()
+    server.shutdown()
+    server.server_close()
+    tg.close()
+    return {
+        "handled": dict(handled), "statuses": dict(statuses), "drained": drained,
+        "max_depth": depth["max"], "lane_size": dispatcher.stats()["capacity"] // workers,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--updates", type=int, default=25, help="updates per user")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--queue-size", type=int, default=6)
+    parser.add_argument("--delay", type=float, default=0.01, help="max seconds per handled update")
+    args = parser.parse_args(argv)
+
+    result = run(args.users, args.updates, args.workers, args.queue_size, args.delay)
+    want = list(range(args.updates))
+    problems = []
+    for uid in range(1, args.users + 1):
+        got = result["handled"].get(uid, [])
+        if got != want:
+            problems.append(f"user {uid}: handled {got}")
+    if not result["drained"]:
+        problems.append("lanes not drained")
+    if result["max_depth"] > result["lane_size"]:
+        problems.append(f"a lane held {result['max_depth']} updates, more than its {result['lane_size']}")
+    if not result["statuses"].get(503):
+        problems.append("no update was rejected; raise --users or --delay to exercise backpressure")
+    for line in problems:
+        print(line)
+    print(f"{args.users} users x {args.updates} updates, HTTP statuses {result['statuses']}, "
+          f"deepest lane {result['max_depth']}/{result['lane_size']}: {'FAIL' if problems else 'ok'}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
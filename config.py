@@ -13,3 +13,99 @@ DB_URL=os.getenv("DB_URL","sqlite:///db.sqlite3")
 ADMIN_CHAT_ID=os.getenv("ADMIN_CHAT_ID")
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN missing")
+
+# Geocoding cache: in-process LRU size and lifetimes (seconds) of found /
+# not-found addresses stored in the ``geocode_cache`` table.
+GEOCODE_CACHE_SIZE=int(os.getenv("GEOCODE_CACHE_SIZE","1024"))
+GEOCODE_TTL=int(os.getenv("GEOCODE_TTL",str(90*24*3600)))
+GEOCODE_NEGATIVE_TTL=int(os.getenv("GEOCODE_NEGATIVE_TTL",str(24*3600)))
+# Nominatim requests per second allowed for the offline geocoding backfill.
+GEOCODE_BACKFILL_RPS=float(os.getenv("GEOCODE_BACKFILL_RPS","1"))
+
+# Static map rendering: on-disk OSM tile cache and in-memory cache of rendered PNGs.
+MAP_TILE_CACHE_DIR=os.getenv("MAP_TILE_CACHE_DIR","tile_cache")
+MAP_TILE_CACHE_MB=int(os.getenv("MAP_TILE_CACHE_MB","200"))
+MAP_RENDER_CACHE_SIZE=int(os.getenv("MAP_RENDER_CACHE_SIZE","64"))
+
+# Map rendering pool: worker processes (0 renders inline), max queued jobs,
+# per-job timeout in seconds.
+MAP_RENDER_WORKERS=int(os.getenv("MAP_RENDER_WORKERS","2"))
+MAP_RENDER_QUEUE=int(os.getenv("MAP_RENDER_QUEUE","8"))
+MAP_RENDER_TIMEOUT=float(os.getenv("MAP_RENDER_TIMEOUT","30"))
+
+# Webhook mode is used when WEBHOOK_URL (the public HTTPS URL Telegram posts
+# to) is set; otherwise the bot long-polls. Updates are handled on
+# UPDATE_WORKERS per-user ordered lanes with at most UPDATE_QUEUE_SIZE waiting.
+WEBHOOK_URL=os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN=os.getenv("WEBHOOK_LISTEN","127.0.0.1")
+WEBHOOK_PORT=int(os.getenv("WEBHOOK_PORT","8080"))
+WEBHOOK_SECRET=os.getenv("WEBHOOK_SECRET")
+UPDATE_WORKERS=int(os.getenv("UPDATE_WORKERS","8"))
+UPDATE_QUEUE_SIZE=int(os.getenv("UPDATE_QUEUE_SIZE","1000"))
+
+# Per-user session state (menu state, wizard progress, last location):
+# "memory" keeps it in-process, "sql" stores it in the database so it survives
+# restarts and is shared between bot processes. Entries expire STATE_TTL
+# seconds after their last update; the memory backend keeps at most
+# STATE_MAX_ENTRIES of them.
+STATE_BACKEND=os.getenv("STATE_BACKEND","memory")
+STATE_TTL=int(os.getenv("STATE_TTL",str(7*24*3600)))
+STATE_MAX_ENTRIES=int(os.getenv("STATE_MAX_ENTRIES","100000"))
+
+# Seconds between full recounts of the per-owner upcoming-event counters.
+# 0 disables the background job including the midnight expiry; run
+# "python -m invevent.event_counters" from cron instead.
+COUNTER_RECONCILE_INTERVAL=int(os.getenv("COUNTER_RECONCILE_INTERVAL","3600"))
+
+# Fan-out of new events and follows into followers' feeds: at most
+# FEED_QUEUE_SIZE pending jobs (when full, the committing thread waits) and
+# FEED_FANOUT_BATCH followers per insert.
+FEED_QUEUE_SIZE=int(os.getenv("FEED_QUEUE_SIZE","1000"))
+FEED_FANOUT_BATCH=int(os.getenv("FEED_FANOUT_BATCH","500"))
+
+# Rendered event cards (details/summary taps and deep links) kept in memory,
+# and how long a card may be served before it is re-read from the database.
+EVENT_CARD_CACHE_SIZE=int(os.getenv("EVENT_CARD_CACHE_SIZE","1024"))
+EVENT_CARD_TTL=int(os.getenv("EVENT_CARD_TTL","300"))
+
+# Write-behind buffering of event joins: when enabled, joins are written in
+# batches every PARTICIPATION_FLUSH_INTERVAL seconds or once
+# PARTICIPATION_BATCH are pending.
+PARTICIPATION_WRITE_BEHIND=os.getenv("PARTICIPATION_WRITE_BEHIND","0")=="1"
+PARTICIPATION_FLUSH_INTERVAL=float(os.getenv("PARTICIPATION_FLUSH_INTERVAL","0.05"))
+PARTICIPATION_BATCH=int(os.getenv("PARTICIPATION_BATCH","500"))
+
+# Connection pool of the database engine (per process). Server databases are
+# also pre-pinged and recycled after DB_POOL_RECYCLE seconds.
+DB_POOL_SIZE=int(os.getenv("DB_POOL_SIZE","10"))
+DB_MAX_OVERFLOW=int(os.getenv("DB_MAX_OVERFLOW","20"))
+DB_POOL_TIMEOUT=float(os.getenv("DB_POOL_TIMEOUT","30"))
+DB_POOL_RECYCLE=int(os.getenv("DB_POOL_RECYCLE","1800"))
+
+# SQLite connection pragmas: WAL lets readers run while a writer commits,
+# busy_timeout (ms) makes writers wait instead of failing with "database is
+# locked", cache_size is in KiB when negative, mmap_size in bytes.
+SQLITE_JOURNAL_MODE=os.getenv("SQLITE_JOURNAL_MODE","WAL")
+SQLITE_SYNCHRONOUS=os.getenv("SQLITE_SYNCHRONOUS","NORMAL")
+SQLITE_BUSY_TIMEOUT=int(os.getenv("SQLITE_BUSY_TIMEOUT","5000"))
+SQLITE_CACHE_SIZE=int(os.getenv("SQLITE_CACHE_SIZE","-65536"))
+SQLITE_MMAP_SIZE=int(os.getenv("SQLITE_MMAP_SIZE",str(256*1024*1024)))
+
+# Database URL of the asyncio engine (AsyncSessionLocal). Empty means DB_URL
+# with its driver swapped for aiosqlite / asyncpg.
+ASYNC_DB_URL=os.getenv("ASYNC_DB_URL","")
+
+# Outbound Bot API queue: sender threads (0 sends synchronously from the
+# handler), global and per-chat send rates (messages per second; groups per
+# minute), how long a chat's first message waits for more to merge with, and
+# how often a send rate-limited with 429 is retried.
+OUTBOX_WORKERS=int(os.getenv("OUTBOX_WORKERS","4"))
+OUTBOX_GLOBAL_RATE=float(os.getenv("OUTBOX_GLOBAL_RATE","30"))
+OUTBOX_CHAT_RATE=float(os.getenv("OUTBOX_CHAT_RATE","1"))
+OUTBOX_CHAT_BURST=float(os.getenv("OUTBOX_CHAT_BURST","3"))
+OUTBOX_GROUP_RATE_PER_MIN=float(os.getenv("OUTBOX_GROUP_RATE_PER_MIN","20"))
+OUTBOX_COALESCE_DELAY=float(os.getenv("OUTBOX_COALESCE_DELAY","0.05"))
+OUTBOX_MAX_RETRIES=int(os.getenv("OUTBOX_MAX_RETRIES","3"))
+
+# Events per page of the "All", "Tomorrow" and friend's event lists.
+EVENTS_PAGE_SIZE=int(os.getenv("EVENTS_PAGE_SIZE","10"))
@@ -1,7 +1,120 @@
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base, sessionmaker
-from .config import DB_URL
-engine=create_engine(DB_URL,echo=False,future=True)
+from .config import (
+    DB_URL, ASYNC_DB_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT, SQLITE_CACHE_SIZE, SQLITE_MMAP_SIZE,
+)
+
+
+def sqlite_pragmas(database):
+    """Return the PRAGMA statements run on every new connection to a SQLite ``database``."""
+    pragmas = [
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size={SQLITE_CACHE_SIZE}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+    ]
+    if database and database != ":memory:":
+        # in-memory databases have no journal file to switch
+        pragmas.insert(0, f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    return pragmas
+
+
+def make_engine(url=DB_URL, *, tuned: bool = True):
+    """Create an engine for ``url``.
+
+    SQLite connections get the pragmas above (WAL, busy timeout, ...); other
+    databases get an explicitly sized pool with pre-ping and recycling.
+    ``tuned=False`` returns a plain engine with SQLAlchemy's defaults.
+    """
+    url = make_url(url)
+    if not tuned:
+        return create_engine(url, echo=False, future=True)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(
+            url, echo=False, future=True,
+            pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True,
+        )
+    kwargs = {}
+    if url.database and url.database != ":memory:":
+        kwargs = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+    eng = create_engine(url, echo=False, future=True, **kwargs)
+    _install_pragmas(eng, url.database)
+    return eng
+
+
+def _install_pragmas(eng, database) -> None:
+    pragmas = sqlite_pragmas(database)
+
+    @event.listens_for(eng, "connect")
+    def _apply_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cur.execute(pragma)
+        cur.close()
+
+
+# sync driver → asyncio driver used by the async engine
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_url(url=DB_URL):
+    """Return ``url`` with its driver swapped for the asyncio one (aiosqlite / asyncpg)."""
+    url = make_url(url)
+    if url.get_dialect().is_async:
+        return url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver known for {backend!r} databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def make_async_engine(url=None):
+    """Create an ``AsyncEngine`` with the same pool settings and pragmas as ``make_engine``.
+
+    ``url`` defaults to ``ASYNC_DB_URL``, or ``DB_URL`` with an asyncio driver.
+    Needs SQLAlchemy's asyncio extra (greenlet) and aiosqlite or asyncpg.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_url(url or ASYNC_DB_URL or DB_URL)
+    if url.get_backend_name() != "sqlite":
+        return create_async_engine(
+            url, echo=False,
+            pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True,
+        )
+    kwargs = {}
+    if url.database and url.database != ":memory:":
+        kwargs = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+    eng = create_async_engine(url, echo=False, **kwargs)
+    _install_pragmas(eng.sync_engine, url.database)
+    return eng
+
+
+engine=make_engine()
 SessionLocal=sessionmaker(bind=engine,expire_on_commit=False,future=True)
 Base=declarative_base()
+
+# Created on first use, so the threaded bot runs without the asyncio drivers.
+async_engine = None
+_async_sessions = None
+
+
+def AsyncSessionLocal():
+    """Return a new ``AsyncSession``: the asyncio counterpart of ``SessionLocal()``.
+
+    Use as ``async with AsyncSessionLocal() as db: ...`` from async handlers
+    (e.g. telebot's ``AsyncTeleBot``); ORM session events such as the counter
+    and feed hooks run for these sessions too.
+    """
+    global async_engine, _async_sessions
+    if _async_sessions is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        async_engine = make_async_engine()
+        _async_sessions = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    return _async_sessions()
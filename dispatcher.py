@@ -0,0 +1,166 @@
+"""Per-user ordered dispatch of incoming updates.
+
+Handlers in ``menus``, ``callbacks`` and the wizard keep per-user state and
+assume one user's updates are handled one after another. ``LaneDispatcher``
+shards updates by ``from_user.id`` onto a fixed number of worker lanes, each
+a thread with its own bounded queue: updates of one user stay strictly
+ordered while different users are served in parallel, so one user's slow
+geocode or map render no longer delays everybody else.
+"""
+import logging
+import queue
+import threading
+import time
+
+from telebot import TeleBot
+
+from .config import UPDATE_WORKERS, UPDATE_QUEUE_SIZE
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+_UPDATE_KINDS = (
+    "message", "edited_message", "callback_query", "inline_query",
+    "chosen_inline_result", "shipping_query", "pre_checkout_query",
+    "poll_answer", "my_chat_member", "chat_member", "chat_join_request",
+)
+
+
+def user_key(update) -> int:
+    """Return the id of the user an update comes from (chat id as fallback, else 0)."""
+    for attr in _UPDATE_KINDS:
+        obj = getattr(update, attr, None)
+        if obj is None:
+            continue
+        user = getattr(obj, "from_user", None) or getattr(obj, "user", None)
+        if user is not None:
+            return user.id
+        chat = getattr(obj, "chat", None)
+        if chat is not None:
+            return chat.id
+    for attr in ("channel_post", "edited_channel_post"):
+        post = getattr(update, attr, None)
+        if post is not None:
+            return post.chat.id
+    return 0
+
+
+class LaneDispatcher:
+    """Bounded worker lanes with strict per-user ordering."""
+
+    def __init__(self, handle, workers: int = UPDATE_WORKERS, queue_size: int = UPDATE_QUEUE_SIZE, key=user_key):
+        self._handle = handle
+        self._key = key
+        per_lane = max(1, queue_size // max(1, workers))
+        self._queues = [queue.Queue(maxsize=per_lane) for _ in range(workers)]
+        self._lock = threading.Lock()
+        self._stats = {"accepted": 0, "rejected": 0, "processed": 0, "failed": 0, "busy_seconds": 0.0}
+        self._threads = []
+
+    def start(self) -> None:
+        """Start the lane threads (once).
+
+        Not done in ``__init__``: the bot is built at import time, and
+        ``render_pool.start()`` must fork its workers before any thread runs.
+        Updates submitted earlier wait in their lane.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._run, args=(q,), name=f"update-lane-{i}", daemon=True)
+                for i, q in enumerate(self._queues)
+            ]
+        for t in self._threads:
+            t.start()
+
+    def _count(self, name: str, value=1) -> None:
+        with self._lock:
+            self._stats[name] += value
+
+    def submit(self, update, block: bool = False) -> bool:
+        """Queue ``update`` on its user's lane.
+
+        With ``block`` the caller waits for room; otherwise False is returned
+        when the lane is full.
+        """
+        lane = self._queues[hash(self._key(update)) % len(self._queues)]
+        try:
+            lane.put(update, block=block)
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("accepted")
+        return True
+
+    def _run(self, q: queue.Queue) -> None:
+        while True:
+            update = q.get()
+            try:
+                if update is _STOP:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    self._handle(update)
+                    self._count("processed")
+                except Exception:
+                    self._count("failed")
+                    log.exception("Update handling failed")
+                self._count("busy_seconds", time.perf_counter() - t0)
+            finally:
+                q.task_done()
+
+    def stats(self) -> dict:
+        """Return counters plus current and maximum queue depths."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = [q.qsize() for q in self._queues]
+        stats["capacity"] = self._queues[0].maxsize * len(self._queues)
+        return stats
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Process everything already queued, then stop the workers.
+
+        Returns False if the queues were not empty after ``timeout`` seconds.
+        """
+        if not self._threads:
+            return not any(q.qsize() for q in self._queues)
+        deadline = time.monotonic() + timeout
+        for q in self._queues:
+            try:
+                q.put(_STOP, timeout=max(0.01, deadline - time.monotonic()))
+            except queue.Full:
+                pass
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        return not any(t.is_alive() for t in self._threads)
+
+
+class DispatchingTeleBot(TeleBot):
+    """``TeleBot`` that hands every update to a ``LaneDispatcher``.
+
+    Telebot's own worker pool gives no ordering guarantee, so the bot runs
+    handlers inline (``threaded=False``) on the dispatcher lanes instead.
+    Polling blocks when a lane is full; the webhook server rejects instead.
+    The lanes run once ``dispatcher.start()`` is called.
+    """
+
+    def __init__(self, token: str, workers: int = UPDATE_WORKERS, queue_size: int = UPDATE_QUEUE_SIZE, **kwargs):
+        kwargs["threaded"] = False
+        super().__init__(token, **kwargs)
+        self.dispatcher = LaneDispatcher(self._handle_update, workers, queue_size)
+        self._update_id_lock = threading.Lock()
+
+    def _handle_update(self, update) -> None:
+        # last_update_id is already past this update (see process_new_updates),
+        # so telebot's own bookkeeping in here leaves it alone
+        TeleBot.process_new_updates(self, [update])
+
+    def process_new_updates(self, updates) -> None:
+        for update in updates:
+            # polling asks for updates after last_update_id; advance it before
+            # queueing, or the next getUpdates returns these again
+            with self._update_id_lock:
+                self.last_update_id = max(self.last_update_id, update.update_id)
+            self.dispatcher.submit(update, block=True)
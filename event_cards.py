@@ -0,0 +1,108 @@
+"""Read-through cache of rendered event cards.
+
+Event taps (details/summary callbacks) and the ``/start desc_``/``join_`` deep
+links show the same few lines of HTML for an event. ``get_card`` renders them
+once per event and keeps them in an in-process LRU, so a widely shared event
+does not cost a database round trip per tap.
+
+Cards are dropped when an event is changed or deleted through an ORM session
+(see the commit hooks below). Changes made by another process or by bulk SQL
+are picked up after ``EVENT_CARD_TTL`` seconds at the latest.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .config import EVENT_CARD_CACHE_SIZE, EVENT_CARD_TTL
+from .database import SessionLocal
+from .models import Event, EventState
+
+_CARDS = OrderedDict()  # event id → (EventCard, expires_at)
+_lock = threading.Lock()
+
+STATS = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+class EventCard(NamedTuple):
+    id: str
+    owner_id: int
+    active: bool
+    summary: str      # title, date and place
+    details: str      # summary plus description, for the "Details" button
+    description: str  # deep-link card
+
+
+def _render(ev) -> EventCard:
+    when = f"{ev.datetime_utc:%Y-%m-%d %H:%M UTC}"
+    return EventCard(
+        id=ev.id,
+        owner_id=ev.owner_id,
+        active=ev.state == EventState.Active,
+        summary=f"<b>{ev.title}</b>\n🗓️ {when}\n📍{ev.location_txt}",
+        details=f"<b>{ev.title}</b>\n{ev.description}\n\n🗓️ {when}\n📍{ev.location_txt}",
+        description=f"<b>{ev.title}</b>\n{ev.description}\n\n🗓️ {when}\n📍 {ev.location_txt}",
+    )
+
+
+def get_card(event_id: str):
+    """Return the ``EventCard`` of ``event_id`` or None if there is no such event."""
+    now = time.monotonic()
+    with _lock:
+        entry = _CARDS.get(event_id)
+        if entry is not None and entry[1] > now:
+            _CARDS.move_to_end(event_id)
+            STATS["hits"] += 1
+            return entry[0]
+        STATS["misses"] += 1
+    with SessionLocal() as db:
+        ev = db.get(Event, event_id)
+        if ev is None:
+            return None
+        card = _render(ev)
+    with _lock:
+        _CARDS[event_id] = (card, now + EVENT_CARD_TTL)
+        _CARDS.move_to_end(event_id)
+        while len(_CARDS) > EVENT_CARD_CACHE_SIZE:
+            _CARDS.popitem(last=False)
+    return card
+
+
+def invalidate(*event_ids: str) -> None:
+    with _lock:
+        for event_id in event_ids:
+            if _CARDS.pop(event_id, None) is not None:
+                STATS["invalidations"] += 1
+
+
+def cache_stats() -> dict:
+    """Return hit/miss counters, the hit rate and the cache size."""
+    with _lock:
+        stats = dict(STATS)
+        stats["size"] = len(_CARDS)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    return stats
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed(session, _flush_context) -> None:
+    changed = session.info.setdefault("changed_events", set())
+    for target in list(session.dirty) + list(session.deleted):
+        if isinstance(target, Event):
+            changed.add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed(session) -> None:
+    changed = session.info.pop("changed_events", None)
+    if changed:
+        invalidate(*changed)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_changed(session, _previous_transaction) -> None:
+    session.info.pop("changed_events", None)
@@ -0,0 +1,116 @@
+"""Maintenance of the per-owner upcoming-event counters.
+
+``UpcomingCount`` is updated on every flush that creates, deletes or changes
+an event (see ``models._maintain_upcoming_counts``). Two things can still make
+it drift: events leave the "upcoming" window when their day is over, and bulk
+SQL statements bypass the flush hook. ``expire`` handles the first right after
+midnight UTC, ``reconcile`` rewrites every counter from ``Event`` and runs
+every ``COUNTER_RECONCILE_INTERVAL`` seconds::
+
+    python -m invevent.event_counters   # one-off reconcile
+"""
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func, update
+
+from .config import COUNTER_RECONCILE_INTERVAL
+from .database import SessionLocal
+from .models import Event, EventState, UpcomingCount, today_start_utc
+
+log = logging.getLogger(__name__)
+
+_stop = threading.Event()
+
+
+def reconcile(owner_ids=None) -> int:
+    """Recompute the counters of ``owner_ids`` (None = everyone); return how many were wrong."""
+    today = today_start_utc()
+    actual_q = (
+        select(Event.owner_id, func.count())
+        .where(Event.state == EventState.Active, Event.datetime_utc >= today)
+        .group_by(Event.owner_id)
+    )
+    stored_q = select(UpcomingCount.owner_id, UpcomingCount.upcoming)
+    if owner_ids is not None:
+        owner_ids = list(owner_ids)
+        if not owner_ids:
+            return 0
+        actual_q = actual_q.where(Event.owner_id.in_(owner_ids))
+        stored_q = stored_q.where(UpcomingCount.owner_id.in_(owner_ids))
+    with SessionLocal() as db:
+        actual = dict(db.execute(actual_q).all())
+        stored = dict(db.execute(stored_q).all())
+        fixed = 0
+        for owner_id in stored.keys() | actual.keys():
+            want = actual.get(owner_id, 0)
+            have = stored.get(owner_id)
+            if have == want or (have is None and want == 0):
+                continue
+            fixed += 1
+            if have is None:
+                db.add(UpcomingCount(owner_id=owner_id, upcoming=want))
+            else:
+                db.execute(update(UpcomingCount).where(UpcomingCount.owner_id == owner_id).values(upcoming=want))
+        db.commit()
+    if fixed:
+        log.info("Corrected %d upcoming-event counters", fixed)
+    return fixed
+
+
+def expire(day_start=None) -> int:
+    """Recount owners whose events dropped out of the window at ``day_start`` (default: today)."""
+    day_start = day_start or today_start_utc()
+    with SessionLocal() as db:
+        owners = db.scalars(
+            select(Event.owner_id).distinct().where(
+                Event.state == EventState.Active,
+                Event.datetime_utc >= day_start - timedelta(days=1),
+                Event.datetime_utc < day_start,
+            )
+        ).all()
+    return reconcile(owners)
+
+
+def _run(interval: float) -> None:
+    day = today_start_utc()
+    next_reconcile = time.monotonic()
+    while not _stop.is_set():
+        try:
+            if time.monotonic() >= next_reconcile:
+                reconcile()
+                next_reconcile = time.monotonic() + interval
+            today = today_start_utc()
+            if today != day:
+                expire(today)
+                day = today
+        except Exception:
+            log.exception("Counter maintenance failed")
+        until_midnight = (day + timedelta(days=1) - datetime.now(timezone.utc)).total_seconds()
+        _stop.wait(max(1.0, min(next_reconcile - time.monotonic(), until_midnight + 1)))
+
+
+def start(interval: float = COUNTER_RECONCILE_INTERVAL) -> None:
+    """Start the background expiry/reconcile thread (``interval`` <= 0 disables it)."""
+    if interval <= 0:
+        return
+    _stop.clear()
+    threading.Thread(target=_run, args=(interval,), name="event-counters", daemon=True).start()
+
+
+def stop() -> None:
+    _stop.set()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Recompute the per-owner upcoming-event counters")
+    parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    log.info("Reconcile finished: %d counters corrected", reconcile())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Local stand-in for Telegram to drive the bot without network access.
+
+``FakeTelegram`` plays both sides of the Bot API:
+
+* it serves the Bot API on localhost (point ``telebot.apihelper.API_URL`` at
+  ``api_url``); every call is recorded in ``calls`` as ``(method, params)``
+  and answered with a plausible ``Message``;
+* it posts updates to a webhook server the way Telegram does, including the
+  secret token header;
+* it answers ``getUpdates`` from the updates passed to ``push``, honouring
+  ``offset`` like Telegram, for polling mode.
+
+Example::
+
+    tg = FakeTelegram()
+    telebot.apihelper.API_URL = tg.api_url
+    tg.post(webhook_url, tg.message(chat_id=1, text="/start"), secret="s")
+"""
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import request
+from urllib.parse import urlsplit, parse_qsl
+
+
+class FakeTelegram:
+    """Recording Bot API server plus webhook update client."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.calls = []
+        self.updates = []  # served by getUpdates
+        self.polls = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                url = urlsplit(self.path)
+                method = url.path.rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length") or 0)
+                params = dict(parse_qsl(url.query))
+                if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+                    params.update(parse_qsl(self.rfile.read(length).decode("utf-8", "replace")))
+                elif length:
+                    self.rfile.read(length)  # multipart uploads are not decoded
+                result = fake._record(method, params)
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST
+
+            def log_message(self, *_args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        host, port = self._server.server_address[:2]
+        self.api_url = f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def _record(self, method: str, params: dict):
+        with self._lock:
+            self.calls.append((method, params))
+        if method in ("sendMessage", "sendPhoto", "sendDocument", "editMessageText"):
+            return {
+                "message_id": next(self._ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+                "photo": [{"file_id": f"photo{len(self.calls)}", "file_unique_id": "u", "width": 1, "height": 1}],
+                "document": {"file_id": f"doc{len(self.calls)}", "file_unique_id": "u"},
+            }
+        if method == "getUpdates":
+            offset = int(params.get("offset") or 0)
+            with self._lock:
+                self.polls += 1
+                return [u for u in self.updates if u["update_id"] >= offset][:int(params.get("limit") or 100)]
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "fake", "username": "fake_bot"}
+        return True
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    # ---- updates ---------------------------------------------------------
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def message(self, chat_id: int, text: str = None, user_id: int = None, **extra) -> dict:
+        """Return an update dict for a private text (or other) message."""
+        msg = {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": self._user(user_id or chat_id),
+        }
+        if text is not None:
+            msg["text"] = text
+        msg.update(extra)
+        return {"update_id": next(self._ids), "message": msg}
+
+    def callback(self, chat_id: int, data: str, user_id: int = None) -> dict:
+        """Return an update dict for an inline button press."""
+        return {
+            "update_id": next(self._ids),
+            "callback_query": {
+                "id": str(next(self._ids)),
+                "from": self._user(user_id or chat_id),
+                "chat_instance": "fake",
+                "data": data,
+                "message": {
+                    "message_id": next(self._ids),
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                },
+            },
+        }
+
+    def push(self, update: dict) -> None:
+        """Make ``update`` available to ``getUpdates``."""
+        with self._lock:
+            self.updates.append(update)
+
+    def post(self, url: str, update: dict, secret: str = None) -> int:
+        """POST ``update`` to a webhook ``url``; return the HTTP status."""
+        req = request.Request(url, data=json.dumps(update).encode(), method="POST",
+                              headers={"Content-Type": "application/json"})
+        if secret:
+            req.add_header("X-Telegram-Bot-Api-Secret-Token", secret)
+        try:
+            with request.urlopen(req, timeout=10) as resp:
+                return resp.status
+        except request.HTTPError as e:
+            return e.code
@@ -0,0 +1,228 @@
+"""Precomputed "friends' events by day" feed, maintained by fan-out on write.
+
+``feed_items`` holds one row per (follower, event day, event) so the events
+menu reads a user's friends' events for a day with a single range scan of the
+primary key. Rows are written after the fact:
+
+* committing a new ``Event`` fans it out to all followers of its owner, in
+  batches of ``FEED_FANOUT_BATCH``;
+* committing a new ``Friendship`` copies the followee's upcoming events into
+  the follower's feed, deleting one retracts them.
+
+The session hooks below only collect these jobs; they run on a single
+background worker in commit order, so a follow and a quick unfollow can't
+be reordered. When the queue is full the committing thread waits for room;
+when the worker is not running (scripts, migrations) the job runs in the
+committing thread instead. Rows of past days
+are purged when the day changes. Deleted events are filtered out at read time.
+"""
+import logging
+import queue
+import threading
+from datetime import timezone
+
+from sqlalchemy import delete, event, exists, insert, literal, select
+from sqlalchemy.orm import Session
+
+from .config import FEED_QUEUE_SIZE, FEED_FANOUT_BATCH
+from .database import SessionLocal
+from .models import Event, EventState, FeedItem, Friendship, today_start_utc
+
+log = logging.getLogger(__name__)
+
+_queue = queue.Queue(maxsize=FEED_QUEUE_SIZE)
+_worker = None
+_STOP = object()
+
+
+def event_day(dt):
+    """Return the UTC calendar day of an event datetime (naive means UTC)."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.date()
+
+
+def fan_out_event(event_id: str, batch_size: int = FEED_FANOUT_BATCH) -> int:
+    """Add ``event_id`` to the feeds of its owner's followers; return rows added."""
+    with SessionLocal() as db:
+        row = db.execute(select(Event.owner_id, Event.datetime_utc).where(Event.id == event_id)).first()
+        if row is None:
+            return 0
+        owner_id, day = row.owner_id, event_day(row.datetime_utc)
+        added, after = 0, None
+        while True:
+            q = select(Friendship.follower_id).where(Friendship.followee_id == owner_id)
+            if after is not None:
+                q = q.where(Friendship.follower_id > after)
+            ids = db.scalars(q.order_by(Friendship.follower_id).limit(batch_size)).all()
+            if not ids:
+                break
+            added += db.execute(
+                insert(FeedItem).from_select(
+                    ["user_id", "day", "event_id"],
+                    select(Friendship.follower_id, literal(day), literal(event_id)).where(
+                        Friendship.followee_id == owner_id,
+                        Friendship.follower_id.between(ids[0], ids[-1]),
+                        ~exists().where(
+                            FeedItem.user_id == Friendship.follower_id,
+                            FeedItem.day == day,
+                            FeedItem.event_id == event_id,
+                        ),
+                    ),
+                )
+            ).rowcount
+            db.commit()
+            after = ids[-1]
+    return added
+
+
+def follow(follower_id: int, followee_id: int) -> int:
+    """Copy the followee's upcoming events into the follower's feed; return rows added."""
+    with SessionLocal() as db:
+        events = db.execute(
+            select(Event.id, Event.datetime_utc).where(
+                Event.owner_id == followee_id,
+                Event.state == EventState.Active,
+                Event.datetime_utc >= today_start_utc(),
+            )
+        ).all()
+        if not events:
+            return 0
+        have = set(db.scalars(
+            select(FeedItem.event_id).where(
+                FeedItem.user_id == follower_id,
+                FeedItem.event_id.in_([e.id for e in events]),
+            )
+        ))
+        rows = [
+            {"user_id": follower_id, "day": event_day(e.datetime_utc), "event_id": e.id}
+            for e in events if e.id not in have
+        ]
+        if rows:
+            db.execute(insert(FeedItem), rows)
+            db.commit()
+    return len(rows)
+
+
+def unfollow(follower_id: int, followee_id: int) -> int:
+    """Remove the followee's events from the follower's feed; return rows removed."""
+    with SessionLocal() as db:
+        n = db.execute(
+            delete(FeedItem).where(
+                FeedItem.user_id == follower_id,
+                FeedItem.event_id.in_(select(Event.id).where(Event.owner_id == followee_id)),
+            )
+        ).rowcount
+        db.commit()
+    return n
+
+
+def purge(before=None) -> int:
+    """Delete feed rows of days before ``before`` (default: today)."""
+    before = before or today_start_utc().date()
+    with SessionLocal() as db:
+        n = db.execute(delete(FeedItem).where(FeedItem.day < before)).rowcount
+        db.commit()
+    return n
+
+
+def rebuild() -> None:
+    """Recreate all feeds from friendships and upcoming events."""
+    with SessionLocal() as db:
+        db.execute(delete(FeedItem))
+        db.commit()
+        pairs = db.execute(select(Friendship.follower_id, Friendship.followee_id)).all()
+    for follower_id, followee_id in pairs:
+        follow(follower_id, followee_id)
+
+
+_JOBS = {"event": fan_out_event, "follow": follow, "unfollow": unfollow}
+
+
+def _run_job(job) -> None:
+    kind, *args = job
+    try:
+        _JOBS[kind](*args)
+    except Exception:
+        log.exception("Feed job %s failed", job)
+
+
+def submit(job) -> None:
+    """Queue a fan-out job, waiting for room when the queue is full.
+
+    Jobs are never run inline while the worker is up: one could overtake
+    jobs queued before it (say, an unfollow its follow). Without a worker the
+    job runs right away.
+    """
+    while _worker is not None and _worker.is_alive():
+        try:
+            _queue.put(job, timeout=5)
+            return
+        except queue.Full:
+            log.warning("Feed queue full; waiting to queue %s", job[0])
+    _run_job(job)
+
+
+def _loop() -> None:
+    day = today_start_utc().date()
+    while True:
+        try:
+            job = _queue.get(timeout=60)
+        except queue.Empty:
+            job = None
+        if job is _STOP:
+            return
+        if job is not None:
+            _run_job(job)
+        today = today_start_utc().date()
+        if today != day:
+            day = today
+            try:
+                log.info("Purged %d feed rows of past days", purge(day))
+            except Exception:
+                log.exception("Feed purge failed")
+
+
+def start() -> None:
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    _worker = threading.Thread(target=_loop, name="feed-fanout", daemon=True)
+    _worker.start()
+
+
+def stop(timeout: float = 30.0) -> None:
+    """Run the queued jobs, then stop the worker."""
+    global _worker
+    if _worker is None:
+        return
+    try:
+        _queue.put(_STOP, timeout=timeout)
+    except queue.Full:
+        log.warning("Feed queue still full at shutdown")
+    _worker.join(timeout)
+    _worker = None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_jobs(session, _flush_context) -> None:
+    jobs = session.info.setdefault("feed_jobs", [])
+    for target in session.new:
+        if isinstance(target, Event):
+            jobs.append(("event", target.id))
+        elif isinstance(target, Friendship):
+            jobs.append(("follow", target.follower_id, target.followee_id))
+    for target in session.deleted:
+        if isinstance(target, Friendship):
+            jobs.append(("unfollow", target.follower_id, target.followee_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_jobs(session) -> None:
+    for job in session.info.pop("feed_jobs", ()):
+        submit(job)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_jobs(session, _previous_transaction) -> None:
+    session.info.pop("feed_jobs", None)
@@ -0,0 +1,50 @@
+"""Grid-cell spatial indexing helpers.
+
+The globe is split into ``CELL_DEG`` × ``CELL_DEG`` cells; every event with
+coordinates stores the integer id of its cell in ``Event.geo_cell``. A radius
+query becomes ``geo_cell IN (...)`` plus a bounding box, both answered by
+indexes, and only the survivors need an exact distance check.
+"""
+from math import cos, floor, radians
+
+CELL_DEG = 0.25
+_LON_CELLS = int(360 / CELL_DEG)
+KM_PER_DEG_LAT = 111.32
+
+# Default search radius of the "nearby" views.
+NEARBY_KM = 30.0
+
+
+def geo_cell(lat, lon):
+    """Return the grid cell id containing (lat, lon), or None without coordinates."""
+    if lat is None or lon is None:
+        return None
+    row = min(int(floor((lat + 90.0) / CELL_DEG)), int(180 / CELL_DEG) - 1)
+    col = int(floor((lon + 180.0) / CELL_DEG)) % _LON_CELLS
+    return row * _LON_CELLS + col
+
+
+def bounding_box(lat: float, lon: float, km: float):
+    """Return (lat_min, lat_max, lon_min, lon_max) enclosing a ``km`` circle.
+
+    Longitudes are not wrapped, so they may leave [-180, 180] near the
+    antimeridian; callers decide how to handle that.
+    """
+    dlat = km / KM_PER_DEG_LAT
+    lat_min, lat_max = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    widest = max(abs(lat_min), abs(lat_max))
+    if widest >= 89.9:
+        return lat_min, lat_max, -180.0, 180.0
+    dlon = km / (KM_PER_DEG_LAT * cos(radians(widest)))
+    if dlon >= 180.0:
+        return lat_min, lat_max, -180.0, 180.0
+    return lat_min, lat_max, lon - dlon, lon + dlon
+
+
+def cells_for_box(lat_min: float, lat_max: float, lon_min: float, lon_max: float):
+    """Return the ids of all grid cells intersecting the bounding box."""
+    rows = range(geo_cell(lat_min, 0) // _LON_CELLS, geo_cell(lat_max, 0) // _LON_CELLS + 1)
+    first = int(floor((lon_min + 180.0) / CELL_DEG))
+    last = int(floor((lon_max + 180.0) / CELL_DEG))
+    cols = {c % _LON_CELLS for c in range(first, min(last, first + _LON_CELLS - 1) + 1)}
+    return sorted(r * _LON_CELLS + c for r in rows for c in cols)
@@ -0,0 +1,154 @@
+"""Cached geocoding of free-text addresses via OpenStreetMap Nominatim.
+
+Lookups go through an in-process LRU first, then the ``geocode_cache`` table
+and only then hit Nominatim. Addresses that Nominatim does not know are cached
+as well (with their own, shorter TTL) so a typo is not re-queried on every map
+view. Network failures are never cached.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import requests
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from .config import GEOCODE_CACHE_SIZE, GEOCODE_TTL, GEOCODE_NEGATIVE_TTL
+from .database import SessionLocal
+from .models import GeocodeCache, Event
+from .geo import geo_cell
+
+log = logging.getLogger(__name__)
+
+# normalized address → (coords or None, expires_at epoch seconds)
+_LRU = OrderedDict()
+_lock = threading.Lock()
+
+STATS = {"lru_hits": 0, "db_hits": 0, "negative_hits": 0, "misses": 0, "errors": 0}
+
+
+def normalize_address(address: str) -> str:
+    """Return the cache key for ``address``: casefolded, single-spaced."""
+    return " ".join(address.casefold().split())[:255]
+
+
+def _fetch(address: str):
+    """Query Nominatim; return (lat, lon) or None. Network errors propagate."""
+    resp = requests.get(
+        "https://nominatim.openstreetmap.org/search",
+        params={"q": address, "format": "json", "limit": 1},
+        headers={"User-Agent": "invevent-bot"},
+        timeout=5,
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    if data:
+        return float(data[0]["lat"]), float(data[0]["lon"])
+    return None
+
+
+def _remember(key: str, coords, expires_at: float) -> None:
+    with _lock:
+        _LRU[key] = (coords, expires_at)
+        _LRU.move_to_end(key)
+        while len(_LRU) > GEOCODE_CACHE_SIZE:
+            _LRU.popitem(last=False)
+
+
+def _count(name: str) -> None:
+    with _lock:
+        STATS[name] += 1
+
+
+def lookup_cached(address: str):
+    """Return ``(hit, coords)`` using only the LRU and the database.
+
+    ``hit`` is False when the address has to be resolved by Nominatim;
+    ``coords`` may be None on a hit for a cached "not found" answer.
+    """
+    key = normalize_address(address)
+    now = time.time()
+    with _lock:
+        entry = _LRU.get(key)
+        if entry and entry[1] > now:
+            _LRU.move_to_end(key)
+            STATS["lru_hits"] += 1
+            if entry[0] is None:
+                STATS["negative_hits"] += 1
+            return True, entry[0]
+
+    with SessionLocal() as db:
+        row = db.get(GeocodeCache, key)
+    if row is None:
+        return False, None
+    fetched = row.fetched_at
+    if fetched.tzinfo is None:
+        fetched = fetched.replace(tzinfo=timezone.utc)
+    coords = None
+    if row.latitude is not None and row.longitude is not None:
+        coords = (row.latitude, row.longitude)
+    expires_at = fetched.timestamp() + (GEOCODE_TTL if coords else GEOCODE_NEGATIVE_TTL)
+    if expires_at <= now:
+        return False, None
+    _remember(key, coords, expires_at)
+    _count("db_hits")
+    if coords is None:
+        _count("negative_hits")
+    return True, coords
+
+
+def _store(key: str, coords) -> None:
+    lat, lon = coords if coords else (None, None)
+    try:
+        with SessionLocal() as db:
+            # fetched_at only has an insert default: a refreshed row needs it set
+            db.merge(GeocodeCache(address=key, latitude=lat, longitude=lon, fetched_at=datetime.now(timezone.utc)))
+            db.commit()
+    except IntegrityError:  # another thread stored the same address first
+        log.debug("Geocode cache entry for '%s' already stored", key)
+    ttl = GEOCODE_TTL if coords else GEOCODE_NEGATIVE_TTL
+    _remember(key, coords, time.time() + ttl)
+
+
+def geocode_address(address: str):
+    """Return (lat, lon) for ``address`` or None, consulting the cache first."""
+    if not address or not address.strip():
+        return None
+    hit, coords = lookup_cached(address)
+    if hit:
+        return coords
+    return geocode_uncached(address)
+
+
+def geocode_uncached(address: str):
+    """Ask Nominatim for ``address`` and cache the answer; for callers that already missed the cache."""
+    _count("misses")
+    try:
+        coords = _fetch(address)
+    except Exception as e:  # pragma: no cover - network failures
+        _count("errors")
+        log.warning("Geocoding failed for '%s': %s", address, e)
+        return None
+    _store(normalize_address(address), coords)
+    return coords
+
+
+def save_event_coords(event_id: str, lat: float, lon: float) -> None:
+    """Write resolved coordinates back onto an event that has none yet."""
+    with SessionLocal() as db:
+        db.execute(
+            update(Event)
+            .where(Event.id == event_id, Event.latitude.is_(None))
+            .values(latitude=lat, longitude=lon, geo_cell=geo_cell(lat, lon))
+        )
+        db.commit()
+
+
+def cache_stats() -> dict:
+    """Return a snapshot of hit/miss counters and the LRU size."""
+    with _lock:
+        stats = dict(STATS)
+        stats["lru_size"] = len(_LRU)
+    return stats
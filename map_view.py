@@ -1,39 +1,59 @@
 from io import BytesIO
+from collections import OrderedDict
 import logging
+import re
+import secrets
+import threading
 from telebot import types
-from staticmap import StaticMap, CircleMarker
+from staticmap import CircleMarker
 from staticmap.staticmap import _lon_to_x, _lat_to_y
 from PIL import ImageDraw, ImageFont
 import folium
-import requests
+from folium.plugins import MarkerCluster
 
 from .helpers import cb
+from .geocoding import geocode_address
+from .geo import NEARBY_KM
+from .tile_cache import CachedStaticMap
+from .config import MAP_RENDER_CACHE_SIZE
+from .media_cache import send_photo_cached, send_document_cached
+from . import render_pool
+from .session_store import namespace
 from math import radians, sin, cos, sqrt, atan2
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
 log = logging.getLogger(__name__)
 
+EARTH_RADIUS_KM = 6371.0
+MAP_WIDTH, MAP_HEIGHT = 600, 400
+MAP_PADDING = 24
+TILE_SIZE = 256
+# markers closer than this many pixels are merged into one numbered cluster
+CLUSTER_CELL_PX = 40
+CLUSTER_PAGE_SIZE = 8
+
+# (width, height, ((event id, lat, lon), ...)) → PNG bytes, least recently used first
+_RENDERED = OrderedDict()
+_render_lock = threading.Lock()
+
+# map token → clusters of [(event id, title), ...] behind the keyboard of a sent map
+MAP_CTX = namespace("map")
+
+_FOLIUM_ID = re.compile(r"_([0-9a-f]{32})\b")
+
 
 def _geocode_address(address: str):
-    """Return (lat, lon) for address using OpenStreetMap Nominatim."""
-    try:
-        resp = requests.get(
-            "https://nominatim.openstreetmap.org/search",
-            params={"q": address, "format": "json", "limit": 1},
-            headers={"User-Agent": "invevent-bot"},
-            timeout=5,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        if data:
-            return float(data[0]["lat"]), float(data[0]["lon"])
-    except Exception as e:  # pragma: no cover - network failures
-        log.warning("Geocoding failed for '%s': %s", address, e)
-    return None
+    """Return (lat, lon) for address, served from the geocoding cache when possible."""
+    return geocode_address(address)
 
 
 def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Return distance in kilometers between two lat/lon points."""
-    r = 6371.0
+    r = EARTH_RADIUS_KM
     dlat = radians(lat2 - lat1)
     dlon = radians(lon2 - lon1)
     a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
@@ -41,105 +61,281 @@ def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return r * c
 
 
-def filter_nearby_events(events, user_lat: float, user_lon: float, max_km: float = 30.0):
-    """Return events located within max_km of the given coordinates."""
+def _event_coords(e):
+    """Return (lat, lon) of event ``e``, or None while its location is unknown.
+
+    Views never geocode: events that only have an address get coordinates
+    when created or from ``backfill_geocode``, and are left out until then.
+    """
+    if e.latitude is not None and e.longitude is not None:
+        return e.latitude, e.longitude
+    return None
+
+
+def _locate(events):
+    """Return ``[(event, lat, lon), ...]`` for events whose location is known."""
     result = []
     for e in events:
-        lat = e.latitude
-        lon = e.longitude
-        if lat is None or lon is None:
-            if e.address:
-                coords = _geocode_address(e.address)
-                if coords:
-                    lat, lon = coords
-        if lat is not None and lon is not None:
-            if _haversine(user_lat, user_lon, lat, lon) <= max_km:
-                result.append(e)
+        coords = _event_coords(e)
+        if coords:
+            result.append((e, coords[0], coords[1]))
     return result
 
 
-def show_events_on_map(bot, chat_id: int, events):
-    """Display all given events on a single map with detail buttons."""
+def haversine_many(user_lat: float, user_lon: float, lats, lons):
+    """Return distances in kilometers from (user_lat, user_lon) to every point.
 
-    evs = []
-    for e in events:
-        lat = e.latitude
-        lon = e.longitude
-        if lat is None or lon is None:
-            if e.address:
-                coords = _geocode_address(e.address)
-                if coords:
-                    lat, lon = coords
-        if lat is not None and lon is not None:
-            evs.append((e, lat, lon))
+    Uses one vectorized NumPy pass when NumPy is installed and falls back to
+    ``_haversine`` per point otherwise (returning a list in that case).
+    """
+    if np is None:
+        return [_haversine(user_lat, user_lon, lat, lon) for lat, lon in zip(lats, lons)]
+    lat1 = radians(user_lat)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(lons, dtype=float) - user_lon)
+    a = np.sin(dlat / 2) ** 2 + cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
-    if not evs:
-        bot.send_message(chat_id, "No events with location to show.")
-        return
 
-    m = StaticMap(600, 400)
-    for e, lat, lon in evs:
-        m.add_marker(CircleMarker((lon, lat), "#d33", 12))
+def rank_by_distance(events, user_lat: float, user_lon: float, max_km=None, top_k=None):
+    """Return ``[(event, km), ...]`` nearest first.
 
-    img = m.render()
+    Events without a known location are skipped; ``max_km`` drops events
+    farther away and ``top_k`` keeps only the k nearest.
+    """
+    located = _locate(events)
+    if not located or top_k == 0:
+        return []
+    dist = haversine_many(user_lat, user_lon, [lat for _e, lat, _lon in located], [lon for _e, _lat, lon in located])
+    if np is None:
+        ranked = sorted(zip((e for e, _lat, _lon in located), dist), key=lambda p: p[1])
+        if max_km is not None:
+            ranked = [p for p in ranked if p[1] <= max_km]
+        return ranked[:top_k] if top_k is not None else ranked
+    idx = np.arange(len(dist))
+    if max_km is not None:
+        idx = idx[dist <= max_km]
+    if top_k is not None and top_k < len(idx):
+        idx = idx[np.argpartition(dist[idx], top_k - 1)[:top_k]]
+    idx = idx[np.argsort(dist[idx], kind="stable")]
+    return [(located[i][0], float(dist[i])) for i in idx]
+
+
+def filter_nearby_events(events, user_lat: float, user_lon: float, max_km: float = NEARBY_KM):
+    """Return events located within max_km of the given coordinates."""
+    located = _locate(events)
+    if not located:
+        return []
+    dist = haversine_many(user_lat, user_lon, [lat for _e, lat, _lon in located], [lon for _e, _lat, lon in located])
+    return [e for (e, _lat, _lon), km in zip(located, dist) if km <= max_km]
+
+
+def _fit_zoom(points, width: int, height: int) -> int:
+    """Return the highest zoom at which all (lat, lon) points fit the canvas."""
+    # tile coordinates double with every zoom level, so the zoom 0 span suffices
+    xs = [_lon_to_x(lon, 0) for _lat, lon in points]
+    ys = [_lat_to_y(lat, 0) for lat, _lon in points]
+    span_x = (max(xs) - min(xs)) * TILE_SIZE
+    span_y = (max(ys) - min(ys)) * TILE_SIZE
+    for z in range(17, -1, -1):
+        if span_x * 2 ** z <= width - 2 * MAP_PADDING and span_y * 2 ** z <= height - 2 * MAP_PADDING:
+            return z
+    return 0
+
+
+def cluster_points(points, width: int = MAP_WIDTH, height: int = MAP_HEIGHT):
+    """Group (lat, lon) points that would overlap on the rendered map.
+
+    Points are bucketed into ``CLUSTER_CELL_PX`` pixel cells at the zoom the
+    map will be drawn with. Returns ``(zoom, [(lat, lon, [point indices]), ...])``
+    with clusters ordered by their first point and placed at their centroid.
+    """
+    zoom = _fit_zoom(points, width, height)
+    cells = {}
+    for i, (lat, lon) in enumerate(points):
+        key = (
+            int(_lon_to_x(lon, zoom) * TILE_SIZE // CLUSTER_CELL_PX),
+            int(_lat_to_y(lat, zoom) * TILE_SIZE // CLUSTER_CELL_PX),
+        )
+        cells.setdefault(key, []).append(i)
+    clusters = []
+    for members in cells.values():
+        lat = sum(points[i][0] for i in members) / len(members)
+        lon = sum(points[i][1] for i in members) / len(members)
+        clusters.append((lat, lon, members))
+    return zoom, clusters
+
+
+def render_static_map(markers, zoom: int, width: int = MAP_WIDTH, height: int = MAP_HEIGHT) -> bytes:
+    """Return PNG bytes of a map with one numbered marker per ``(lat, lon, count)``.
+
+    Markers standing for more than one event get a larger circle with the
+    event count as a badge.
+    """
+    m = CachedStaticMap(width, height)
+    for lat, lon, count in markers:
+        if count > 1:
+            m.add_marker(CircleMarker((lon, lat), "#a11", 24))
+        else:
+            m.add_marker(CircleMarker((lon, lat), "#d33", 12))
+
+    img = m.render(zoom=zoom)
     draw = ImageDraw.Draw(img)
     font = ImageFont.load_default()
 
-    for idx, (e, lat, lon) in enumerate(evs, start=1):
+    for idx, (lat, lon, count) in enumerate(markers, start=1):
         x = m._x_to_px(_lon_to_x(lon, m.zoom))
         y = m._y_to_px(_lat_to_y(lat, m.zoom))
-        draw.text((x + 6, y - 12), str(idx), fill="black", font=font)
+        if count > 1:
+            draw.text((x, y), str(count), fill="white", font=font, anchor="mm")
+            draw.text((x + 12, y - 18), str(idx), fill="black", font=font)
+        else:
+            draw.text((x + 6, y - 12), str(idx), fill="black", font=font)
 
     buf = BytesIO()
     img.save(buf, format="PNG")
-    buf.seek(0)
+    return buf.getvalue()
+
 
+def cluster_keyboard(token: str, page: int = 0):
+    """Return the inline keyboard for one page of a clustered map, or None if expired.
+
+    Single-event markers link to the event summary, larger clusters open a
+    list of their events.
+    """
+    clusters = MAP_CTX.get(token)
+    if clusters is None:
+        return None
+    pages = max(1, -(-len(clusters) // CLUSTER_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
     kb = types.InlineKeyboardMarkup(row_width=2)
-    for idx, (e, _lat, _lon) in enumerate(evs, start=1):
-        kb.add(types.InlineKeyboardButton(f"{idx}. {e.title}", callback_data=cb(e.id, "summary")))
+    first = page * CLUSTER_PAGE_SIZE
+    for idx, members in enumerate(clusters[first:first + CLUSTER_PAGE_SIZE], start=first + 1):
+        if len(members) == 1:
+            eid, title = members[0]
+            kb.add(types.InlineKeyboardButton(f"{idx}. {title}", callback_data=cb(eid, "summary")))
+        else:
+            kb.add(types.InlineKeyboardButton(f"{idx}. {len(members)} events", callback_data=f"mapc:{token}:{idx - 1}"))
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(types.InlineKeyboardButton("◀", callback_data=f"mapp:{token}:{page - 1}"))
+        nav.append(types.InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="noop"))
+        if page < pages - 1:
+            nav.append(types.InlineKeyboardButton("▶", callback_data=f"mapp:{token}:{page + 1}"))
+        kb.row(*nav)
+    return kb
 
-    bot.send_photo(chat_id, buf, reply_markup=kb)
 
+def _remember_clusters(clusters) -> str:
+    token = secrets.token_hex(4)
+    MAP_CTX.set(token, clusters)
+    return token
 
-def show_events_interactive_map(bot, chat_id: int, events):
-    """Send an interactive HTML map with markers for each event."""
 
-    evs = []
-    for e in events:
-        lat = e.latitude
-        lon = e.longitude
-        if lat is None or lon is None:
-            if e.address:
-                coords = _geocode_address(e.address)
-                if coords:
-                    lat, lon = coords
-        if lat is not None and lon is not None:
-            evs.append((e, lat, lon))
+def _rendered_get(key):
+    with _render_lock:
+        png = _RENDERED.get(key)
+        if png is not None:
+            _RENDERED.move_to_end(key)
+        return png
+
+
+def _rendered_put(key, png: bytes) -> None:
+    with _render_lock:
+        _RENDERED[key] = png
+        while len(_RENDERED) > MAP_RENDER_CACHE_SIZE:
+            _RENDERED.popitem(last=False)
+
+
+def show_events_on_map(bot, chat_id: int, events):
+    """Display all given events on a single map with a keyboard of its markers.
+
+    Nearby events are merged into numbered clusters and the keyboard is
+    paginated by cluster, so image and keyboard stay readable for any
+    number of events.
+
+    The image comes from the render cache when the same events were drawn
+    recently, otherwise it is rendered in the map rendering pool and sent
+    when ready.
+    """
+
+    # sorted by id so marker numbers match the render cache key
+    evs = sorted(_locate(events), key=lambda p: p[0].id)
 
     if not evs:
         bot.send_message(chat_id, "No events with location to show.")
         return
 
-    first_lat, first_lon = evs[0][1], evs[0][2]
+    zoom, clusters = cluster_points([(lat, lon) for _e, lat, lon in evs])
+    token = _remember_clusters([[(evs[i][0].id, evs[i][0].title) for i in members] for _lat, _lon, members in clusters])
+    kb = cluster_keyboard(token)
+
+    key = (MAP_WIDTH, MAP_HEIGHT, tuple((e.id, lat, lon) for e, lat, lon in evs))
+    png = _rendered_get(key)
+    if png is not None:
+        send_photo_cached(bot, chat_id, png, reply_markup=kb)
+        return
+
+    def deliver(png):
+        _rendered_put(key, png)
+        send_photo_cached(bot, chat_id, png, reply_markup=kb)
+
+    markers = [(lat, lon, len(members)) for lat, lon, members in clusters]
+    render_pool.submit(bot, chat_id, render_static_map, (markers, zoom, MAP_WIDTH, MAP_HEIGHT), deliver)
+
+
+def _canonical_html(html: str) -> str:
+    """Replace folium's random element ids by sequential ones.
+
+    Identical maps then produce identical documents, which lets
+    ``send_document_cached`` reuse the previous upload.
+    """
+    ids = {}
+    return _FOLIUM_ID.sub(lambda mo: "_%d" % ids.setdefault(mo.group(1), len(ids)), html)
+
+
+def render_interactive_map(markers) -> str:
+    """Return folium HTML for ``[(lat, lon, popup_html), ...]``."""
+    first_lat, first_lon = markers[0][0], markers[0][1]
     m = folium.Map(location=[first_lat, first_lon], zoom_start=12)
 
+    layer = MarkerCluster().add_to(m)
+    for lat, lon, popup_text in markers:
+        folium.Marker(
+            [lat, lon],
+            popup=folium.Popup(popup_text, max_width=300),
+        ).add_to(layer)
+
+    return _canonical_html(m.get_root().render())
+
+
+def show_events_interactive_map(bot, chat_id: int, events):
+    """Send an interactive HTML map with markers for each event."""
+
+    evs = _locate(events)
+
+    if not evs:
+        bot.send_message(chat_id, "No events with location to show.")
+        return
+
+    markers = []
     for e, lat, lon in evs:
         popup_text = (
             f"<b>{e.title}</b><br>"
             f"{e.datetime_utc:%Y-%m-%d %H:%M UTC}<br>"
             f"{e.location_txt or ''}"
         )
-        folium.Marker(
-            [lat, lon],
-            popup=folium.Popup(popup_text, max_width=300),
-        ).add_to(m)
+        markers.append((lat, lon, popup_text))
 
-    html = m.get_root().render()
-    buf = BytesIO(html.encode("utf-8"))
-    buf.name = "events_map.html"
+    def deliver(html):
+        send_document_cached(
+            bot,
+            chat_id,
+            html.encode("utf-8"),
+            "events_map.html",
+            caption="Open this file to view the interactive map.",
+        )
 
-    bot.send_document(
-        chat_id,
-        buf,
-        caption="Open this file to view the interactive map.",
-    )
+    render_pool.submit(bot, chat_id, render_interactive_map, (markers,), deliver)
@@ -0,0 +1,96 @@
+"""Resend identical map images and documents by Telegram ``file_id``.
+
+The SHA-256 of every uploaded file is stored with the ``file_id`` Telegram
+returned for it. Sending the same content again is then a lightweight
+``file_id`` reference instead of a fresh upload. A ``file_id`` Telegram no
+longer accepts is dropped and the content is uploaded again. Both steps
+run from send callbacks, so a queued send does not block the caller.
+"""
+import hashlib
+import logging
+import threading
+from io import BytesIO
+
+from sqlalchemy.exc import IntegrityError
+from telebot.apihelper import ApiTelegramException
+
+from .database import SessionLocal
+from .models import MediaFile
+from .outbox import after_send
+
+log = logging.getLogger(__name__)
+
+# content hash → file_id, mirrors the media_files table
+_FILE_IDS = {}
+_lock = threading.Lock()
+
+
+def _lookup(digest: str):
+    with _lock:
+        file_id = _FILE_IDS.get(digest)
+    if file_id:
+        return file_id
+    with SessionLocal() as db:
+        row = db.get(MediaFile, digest)
+    if row is None:
+        return None
+    with _lock:
+        _FILE_IDS[digest] = row.file_id
+    return row.file_id
+
+
+def _remember(digest: str, kind: str, file_id: str) -> None:
+    with _lock:
+        _FILE_IDS[digest] = file_id
+    try:
+        with SessionLocal() as db:
+            db.merge(MediaFile(content_hash=digest, kind=kind, file_id=file_id))
+            db.commit()
+    except IntegrityError:  # stored concurrently by another thread
+        pass
+
+
+def _forget(digest: str) -> None:
+    with _lock:
+        _FILE_IDS.pop(digest, None)
+    with SessionLocal() as db:
+        row = db.get(MediaFile, digest)
+        if row:
+            db.delete(row)
+            db.commit()
+
+
+def _upload(kind: str, send, chat_id: int, content: bytes, digest: str, filename, **kwargs):
+    buf = BytesIO(content)
+    if filename:
+        buf.name = filename
+
+    def uploaded(msg):
+        media = msg.photo[-1] if kind == "photo" else msg.document
+        _remember(digest, kind, media.file_id)
+
+    return after_send(lambda: send(chat_id, buf, **kwargs), on_sent=uploaded)
+
+
+def _send(kind: str, send, chat_id: int, content: bytes, filename, **kwargs):
+    digest = hashlib.sha256(content).hexdigest()
+    file_id = _lookup(digest)
+    if not file_id:
+        return _upload(kind, send, chat_id, content, digest, filename, **kwargs)
+
+    def rejected(e: ApiTelegramException):
+        log.info("Cached %s file_id rejected, uploading again: %s", kind, e)
+        _forget(digest)
+        _upload(kind, send, chat_id, content, digest, filename, **kwargs)
+
+    return after_send(lambda: send(chat_id, file_id, **kwargs), on_error=rejected)
+
+
+def send_photo_cached(bot, chat_id: int, content: bytes, **kwargs):
+    """Send PNG/JPEG ``content`` as a photo, reusing a known ``file_id``."""
+    return _send("photo", bot.send_photo, chat_id, content, None, **kwargs)
+
+
+def send_document_cached(bot, chat_id: int, content: bytes, filename: str, **kwargs):
+    """Send ``content`` as a document named ``filename``, reusing a known ``file_id``."""
+    return _send("document", bot.send_document, chat_id, content, filename, **kwargs)
@@ -1,13 +1,18 @@
 from datetime import datetime, timezone, timedelta
 from telebot import types
-from telebot.handler_backends import ContinueHandling
-from sqlalchemy import select
+from sqlalchemy import select, or_, and_
 
-from ..database import SessionLocal
-from ..models import Event, Participation, EventState, Friendship, User
+from ..config import EVENTS_PAGE_SIZE
+from ..database import SessionLocal, AsyncSessionLocal
+from ..models import Event, EventTag, Participation, EventState, Friendship, User, FeedItem, split_tags
 from ..helpers import cb
-from ..map_view import show_events_on_map, filter_nearby_events
-from .state import set_state, get_state
+from ..map_view import show_events_on_map, filter_nearby_events, rank_by_distance
+from ..geo import NEARBY_KM, bounding_box, cells_for_box
+from ..read_models import event_rows, event_rows_async, event_rows_stmt
+from ..router import ROUTER
+from ..session_store import namespace
+from ..wizard.wizard_utils import TOPICS
+from .state import set_state
 
 import logging
 
@@ -15,7 +20,7 @@ log = logging.getLogger(__name__)
 
 # ──────────────────────────── keyboards ─────────────────────────────
 EVENTS_KB = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
-EVENTS_KB.add("All", "Tomorrow", "Friend's events", "Location", "⬅️ Back")
+EVENTS_KB.add("All", "Tomorrow", "Topics", "Friend's events", "Location", "⬅️ Back")
 
 LOC_KB = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
 LOC_KB.add(types.KeyboardButton("📍 Send my current location", request_location=True))
@@ -25,8 +30,8 @@ LIST_KB = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
 LIST_KB.add("📍 Show on map", "📍 Nearby")
 LIST_KB.add("⬅️ Back")
 
-# store last known location per user
-LAST_LOCATION = {}
+# last known location per user
+LAST_LOCATION = namespace("location")
 
 
 def _today_range(offset: int = 0):
@@ -35,19 +40,37 @@ def _today_range(offset: int = 0):
     return start, end
 
 
-def _list_events(events, *, show_owner: bool = False):
+def _owner_names_stmt(events):
+    return select(User.id, User.first_name).where(User.id.in_({e.owner_id for e in events}))
+
+
+def _owner_names(events) -> dict:
+    if not events:
+        return {}
+    with SessionLocal() as db:
+        return dict(db.execute(_owner_names_stmt(events)).all())
+
+
+async def _owner_names_async(events) -> dict:
+    if not events:
+        return {}
+    async with AsyncSessionLocal() as db:
+        return dict((await db.execute(_owner_names_stmt(events))).all())
+
+
+def _list_events(events, *, show_owner: bool = False, owner_names=None):
+    """Return (text, inline keyboard) listing ``events``.
+
+    With ``show_owner`` the owners' names are looked up unless passed in
+    ``owner_names`` (async callers pass ``await _owner_names_async(events)``).
+    """
     kb = types.InlineKeyboardMarkup()
-    owner_names = {}
-    if show_owner:
-        with SessionLocal() as db:
-            ids = {e.owner_id for e in events}
-            if ids:
-                rows = db.execute(select(User.id, User.first_name).where(User.id.in_(ids))).all()
-                owner_names = {uid: name for uid, name in rows}
+    if show_owner and owner_names is None:
+        owner_names = _owner_names(events)
     for e in events:
         title = e.title
-        if title.lower() == "other" and e.tags:
-            title = e.tags.split(",")[0]
+        if title.lower() == "other":
+            title = next(iter(split_tags(e.tags)), title)
         parts = []
         if show_owner:
             parts.append(owner_names.get(e.owner_id, str(e.owner_id)))
@@ -59,39 +82,187 @@ def _list_events(events, *, show_owner: bool = False):
     return "(none)", None
 
 
+def _friend_ids_stmt(uid: int):
+    return select(Friendship.followee_id).where(Friendship.follower_id == uid)
+
+
 def _friend_ids(uid: int):
     with SessionLocal() as db:
-        return db.scalars(select(Friendship.followee_id).where(Friendship.follower_id == uid)).all()
+        return db.scalars(_friend_ids_stmt(uid)).all()
+
+
+async def _friend_ids_async(uid: int):
+    async with AsyncSessionLocal() as db:
+        return (await db.scalars(_friend_ids_stmt(uid))).all()
+
+
+def _nearby_conditions(lat: float, lon: float, km: float = NEARBY_KM):
+    """Return SQL conditions keeping events in the bounding box around (lat, lon)."""
+    lat_min, lat_max, lon_min, lon_max = bounding_box(lat, lon, km)
+    conds = [
+        Event.geo_cell.in_(cells_for_box(lat_min, lat_max, lon_min, lon_max)),
+        Event.latitude.between(lat_min, lat_max),
+    ]
+    if lon_min >= -180.0 and lon_max <= 180.0:
+        conds.append(Event.longitude.between(lon_min, lon_max))
+    elif lon_min < -180.0:
+        conds.append(or_(Event.longitude >= lon_min + 360.0, Event.longitude <= lon_max))
+    else:
+        conds.append(or_(Event.longitude >= lon_min, Event.longitude <= lon_max - 360.0))
+    return conds
+
+
+def _active_events_stmt(start, end=None, *, owners=None, near=None):
+    """Select ``EventRow`` columns of active events starting in [start, end).
+
+    ``owners`` limits the result to the given owner ids, ``near=(lat, lon)``
+    prefilters in SQL to the bounding box of the nearby radius; exact
+    distances are left to ``filter_nearby_events``/``rank_by_distance``.
+    """
+    conds = [Event.state == EventState.Active, Event.datetime_utc >= start]
+    if end is not None:
+        conds.append(Event.datetime_utc < end)
+    if owners is not None:
+        conds.append(Event.owner_id.in_(owners))
+    if near is not None:
+        conds.extend(_nearby_conditions(*near))
+    return event_rows_stmt().where(*conds)
+
+
+def _active_events(start, end=None, *, owners=None, near=None):
+    with SessionLocal() as db:
+        return event_rows(db, _active_events_stmt(start, end, owners=owners, near=near))
+
+
+async def _active_events_async(start, end=None, *, owners=None, near=None):
+    async with AsyncSessionLocal() as db:
+        return await event_rows_async(db, _active_events_stmt(start, end, owners=owners, near=near))
+
+
+def _friends_events_today_stmt(uid: int, near=None):
+    """Select today's active events of the users ``uid`` follows, read from the feed."""
+    start, _ = _today_range()
+    conds = [FeedItem.user_id == uid, FeedItem.day == start.date(), Event.state == EventState.Active]
+    if near is not None:
+        conds.extend(_nearby_conditions(*near))
+    return event_rows_stmt().join(FeedItem, FeedItem.event_id == Event.id).where(*conds)
+
+
+def _friends_events_today(uid: int, near=None):
+    with SessionLocal() as db:
+        return event_rows(db, _friends_events_today_stmt(uid, near))
+
 
+async def _friends_events_today_async(uid: int, near=None):
+    async with AsyncSessionLocal() as db:
+        return await event_rows_async(db, _friends_events_today_stmt(uid, near))
 
-def _friends_events_today(uid: int):
-    start, end = _today_range()
-    ids = _friend_ids(uid)
-    if not ids:
-        return []
+
+# list views that page with "evp:" callbacks:
+# view code → (title, day offset, days shown or None for all upcoming, show owner)
+PAGED_VIEWS = {
+    "a": ("All events today", 0, 1, True),
+    "t": ("Events tomorrow", 1, 1, True),
+    "f": ("Friend's events today", 0, 1, False),  # "f<friend id>"
+    "g": ("Upcoming {topic} events", 0, None, True),  # "g<index in TOPICS>"
+}
+
+
+def _events_page_stmt(start, end=None, *, owners=None, tag=None, boundary=None, backward=False,
+                      limit=EVENTS_PAGE_SIZE):
+    """Select one page of active events from ``start`` (until ``end``), ordered by (datetime_utc, id).
+
+    Keyset pagination: the page starts after (or, ``backward``, ends before)
+    the event ``boundary``; ``limit`` + 1 rows tell whether another page
+    follows. With ``tag`` the range is read from the (tag, datetime_utc)
+    index of ``event_tags``.
+    """
+    stmt = event_rows_stmt()
+    at_col, id_col = Event.datetime_utc, Event.id
+    conds = [Event.state == EventState.Active]
+    if tag is not None:
+        stmt = stmt.join(EventTag, EventTag.event_id == Event.id)
+        at_col, id_col = EventTag.datetime_utc, EventTag.event_id
+        conds.append(EventTag.tag == tag)
+    conds.append(at_col >= start)
+    if end is not None:
+        conds.append(at_col < end)
+    if owners is not None:
+        conds.append(Event.owner_id.in_(owners))
+    if boundary is not None:
+        at = select(Event.datetime_utc).where(Event.id == boundary).scalar_subquery()
+        if backward:
+            conds += [at_col <= at, or_(at_col < at, id_col < boundary)]
+        else:
+            conds += [at_col >= at, or_(at_col > at, id_col > boundary)]
+    order = (at_col.desc(), id_col.desc()) if backward else (at_col, id_col)
+    return stmt.where(and_(*conds)).order_by(*order).limit(limit + 1)
+
+
+def _page_result(rows, boundary, backward, limit=EVENTS_PAGE_SIZE):
+    """Return (rows in list order, has previous page, has next page)."""
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        return rows[::-1], more, True
+    return rows, boundary is not None, more
+
+
+def _events_page(start, end=None, *, owners=None, tag=None, boundary=None, backward=False):
+    stmt = _events_page_stmt(start, end, owners=owners, tag=tag, boundary=boundary, backward=backward)
     with SessionLocal() as db:
-        return db.scalars(
-            select(Event).where(
-                Event.owner_id.in_(ids),
-                Event.state == EventState.Active,
-                Event.datetime_utc >= start,
-                Event.datetime_utc < end,
-            )
-        ).all()
+        rows = event_rows(db, stmt)
+    return _page_result(rows, boundary, backward)
+
+
+async def _events_page_async(start, end=None, *, owners=None, tag=None, boundary=None, backward=False):
+    stmt = _events_page_stmt(start, end, owners=owners, tag=tag, boundary=boundary, backward=backward)
+    async with AsyncSessionLocal() as db:
+        rows = await event_rows_async(db, stmt)
+    return _page_result(rows, boundary, backward)
+
+
+def _paged_list(view: str, boundary=None, backward=False):
+    """Return (header text, inline keyboard) of one page of list ``view``."""
+    title, offset, days, show_owner = PAGED_VIEWS[view[0]]
+    start, _ = _today_range(offset)
+    end = start + timedelta(days=days) if days else None
+    owners = [int(view[1:])] if view[0] == "f" else None
+    tag = TOPICS[int(view[1:])] if view[0] == "g" else None
+    title = title.format(topic=tag)
+    rows, has_prev, has_next = _events_page(
+        start, end, owners=owners, tag=tag, boundary=boundary, backward=backward
+    )
+    if not rows and boundary is not None:
+        # the boundary event is gone or the day has moved on: start over
+        return _paged_list(view)
+    text, kb = _list_events(rows, show_owner=show_owner)
+    nav = []
+    if has_prev:
+        nav.append(types.InlineKeyboardButton("◀ Prev", callback_data=f"evp:{view}:p:{rows[0].id}"))
+    if has_next:
+        nav.append(types.InlineKeyboardButton("Next ▶", callback_data=f"evp:{view}:n:{rows[-1].id}"))
+    if nav:
+        kb.row(*nav)
+    header = f"<b>{title}:</b>"
+    if text:
+        header += "\n" + text
+    return header, kb
 
 
 def register(bot):
-    @bot.message_handler(func=lambda m: m.text == "📅 Events")
+    @ROUTER.message("📅 Events")
     def events_main(msg):
         uid = msg.from_user.id
-        if uid not in LAST_LOCATION:
+        loc = LAST_LOCATION.get(uid)
+        if loc is None:
             set_state(uid, "await_location")
             bot.send_message(msg.chat.id, "Send your location to see today's events from friends:", reply_markup=LOC_KB)
             return
         set_state(uid, "events")
-        lat, lon = LAST_LOCATION[uid]
-        events = _friends_events_today(uid)
-        events = filter_nearby_events(events, lat, lon)
+        lat, lon = loc
+        events = _friends_events_today(uid, near=(lat, lon))
+        events = [e for e, _km in rank_by_distance(events, lat, lon, max_km=NEARBY_KM)]
         text, kb = _list_events(events, show_owner=True)
         header = "<b>Today's nearby events:</b>"
         if text:
@@ -99,15 +270,14 @@ def register(bot):
         bot.send_message(msg.chat.id, header, parse_mode="HTML", reply_markup=kb)
         bot.send_message(msg.chat.id, "Menu:", reply_markup=EVENTS_KB)
 
-    @bot.message_handler(content_types=["location"])
+    @ROUTER.message(states=("await_location",), content_types=("location",))
     def save_location(msg):
         uid = msg.from_user.id
-        if get_state(uid) != "await_location":
-            return ContinueHandling()
-        LAST_LOCATION[uid] = (msg.location.latitude, msg.location.longitude)
+        lat, lon = msg.location.latitude, msg.location.longitude
+        LAST_LOCATION.set(uid, (lat, lon))
         set_state(uid, "events")
-        events = _friends_events_today(uid)
-        events = filter_nearby_events(events, msg.location.latitude, msg.location.longitude)
+        events = _friends_events_today(uid, near=(lat, lon))
+        events = [e for e, _km in rank_by_distance(events, lat, lon, max_km=NEARBY_KM)]
         text, kb = _list_events(events, show_owner=True)
         header = "<b>Today's nearby events:</b>"
         if text:
@@ -115,43 +285,37 @@ def register(bot):
         bot.send_message(msg.chat.id, header, parse_mode="HTML", reply_markup=kb)
         bot.send_message(msg.chat.id, "Menu:", reply_markup=EVENTS_KB)
 
-    @bot.message_handler(func=lambda m: get_state(m.from_user.id) == "events" and m.text == "All")
+    @ROUTER.message("All", states=("events",))
     def all_today(msg):
-        start, end = _today_range()
-        with SessionLocal() as db:
-            events = db.scalars(
-                select(Event).where(
-                    Event.state == EventState.Active,
-                    Event.datetime_utc >= start,
-                    Event.datetime_utc < end,
-                )
-            ).all()
-        text, kb = _list_events(events, show_owner=True)
-        header = "<b>All events today:</b>"
-        if text:
-            header += "\n" + text
+        header, kb = _paged_list("a")
         bot.send_message(msg.chat.id, header, parse_mode="HTML", reply_markup=kb)
 
-    @bot.message_handler(func=lambda m: get_state(m.from_user.id) == "events" and m.text == "Tomorrow")
+    @ROUTER.message("Tomorrow", states=("events",))
     def all_tomorrow(msg):
-        start, end = _today_range(1)
-        with SessionLocal() as db:
-            events = db.scalars(
-                select(Event).where(
-                    Event.state == EventState.Active,
-                    Event.datetime_utc >= start,
-                    Event.datetime_utc < end,
-                )
-            ).all()
-        text, kb = _list_events(events, show_owner=True)
-        header = "<b>Events tomorrow:</b>"
-        if text:
-            header += "\n" + text
+        header, kb = _paged_list("t")
         bot.send_message(msg.chat.id, header, parse_mode="HTML", reply_markup=kb)
 
-    SELECT_CTX = {}
+    @ROUTER.message("Topics", states=("events",))
+    def choose_topic(msg):
+        kb = types.InlineKeyboardMarkup(row_width=2)
+        kb.add(*(types.InlineKeyboardButton(t, callback_data=f"topic:{i}") for i, t in enumerate(TOPICS)))
+        bot.send_message(msg.chat.id, "Choose topic:", reply_markup=kb)
+
+    @ROUTER.callback("topic")
+    def show_topic(c):
+        index = int(c.data.split(":", 1)[1])
+        header, kb = _paged_list(f"g{index}")
+        bot.answer_callback_query(c.id)
+        bot.send_message(c.message.chat.id, header, parse_mode="HTML", reply_markup=kb)
+
+    @ROUTER.callback("evp")
+    def events_page(c):
+        _, view, direction, boundary = c.data.split(":", 3)
+        _, kb = _paged_list(view, boundary, backward=direction == "p")
+        bot.answer_callback_query(c.id)
+        bot.edit_message_reply_markup(c.message.chat.id, c.message.message_id, reply_markup=kb)
 
-    @bot.message_handler(func=lambda m: get_state(m.from_user.id) == "events" and m.text == "Friend's events")
+    @ROUTER.message("Friend's events", states=("events",))
     def choose_friend(msg):
         uid = msg.from_user.id
         with SessionLocal() as db:
@@ -163,42 +327,29 @@ def register(bot):
         kb = types.InlineKeyboardMarkup()
         for u in users:
             kb.add(types.InlineKeyboardButton(u.first_name, callback_data=f"frsel:{u.id}"))
-        SELECT_CTX[uid] = True
         bot.send_message(msg.chat.id, "Choose friend:", reply_markup=kb)
 
-    @bot.callback_query_handler(func=lambda c: c.data.startswith("frsel:"))
+    @ROUTER.callback("frsel")
     def show_friend(c):
         uid = c.from_user.id
         fid = int(c.data.split(":", 1)[1])
-        start, end = _today_range()
-        with SessionLocal() as db:
-            events = db.scalars(
-                select(Event).where(
-                    Event.owner_id == fid,
-                    Event.state == EventState.Active,
-                    Event.datetime_utc >= start,
-                    Event.datetime_utc < end,
-                )
-            ).all()
-        text, kb = _list_events(events)
-        header = "<b>Friend's events today:</b>"
-        if text:
-            header += "\n" + text
+        header, kb = _paged_list(f"f{fid}")
         bot.answer_callback_query(c.id)
         bot.send_message(c.message.chat.id, header, parse_mode="HTML", reply_markup=kb)
 
-    @bot.message_handler(func=lambda m: get_state(m.from_user.id) == "events" and m.text == "Location")
+    @ROUTER.message("Location", states=("events",))
     def show_map(msg):
         uid = msg.from_user.id
-        if uid not in LAST_LOCATION:
+        loc = LAST_LOCATION.get(uid)
+        if loc is None:
             bot.reply_to(msg, "No location set.")
             return
-        lat, lon = LAST_LOCATION[uid]
-        events = _friends_events_today(uid)
+        lat, lon = loc
+        events = _friends_events_today(uid, near=(lat, lon))
         events = filter_nearby_events(events, lat, lon)
         show_events_on_map(bot, msg.chat.id, events)
 
-    @bot.message_handler(func=lambda m: m.text == "⬅️ Back")
+    @ROUTER.message("⬅️ Back")
     def back(msg):
         from ..bot import MAIN_KB
         set_state(msg.from_user.id, "main")
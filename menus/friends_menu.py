@@ -1,13 +1,14 @@
 from datetime import datetime, timezone
 from telebot import types
-from telebot.handler_backends import ContinueHandling
 from sqlalchemy import select, func
 
-from ..database import SessionLocal
-from ..models import User, Event, Friendship, EventState
+from ..database import SessionLocal, AsyncSessionLocal
+from ..models import User, Friendship, UpcomingCount
 from ..helpers import ucb
+from ..router import ROUTER
+from ..session_store import namespace
 from .state import set_state, get_state
-from .events_menu import _list_events, LIST_KB
+from .events_menu import _list_events, _active_events, LIST_KB
 
 # Keyboards
 FRIENDS_KB = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
@@ -19,60 +20,90 @@ BACK_KB.add("⬅️ Back")
 USER_KB = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
 USER_KB.add("🚫 Unfollow", "🗑 Unfriend", "📅 Friend’s events", "⬅️ Back", "🏠 Main menu")
 
+# Menu states in which "⬅️ Back" navigates within the friends menu
+FRIENDS_STATES = ("friends", "followers", "followed", "friend_user", "friend_events", "friend_nearby_wait")
+
+# Followers/followed shown per keyboard page
+PEOPLE_PAGE_SIZE = 20
+PEOPLE_TITLES = {"followers": "Followers", "followed": "Followed"}
+
 # Context information about selected friend
-USER_CTX = {}
+USER_CTX = namespace("friend")
+
+
+def _people_page_stmt(uid: int, kind: str, after: int = 0, limit: int = PEOPLE_PAGE_SIZE):
+    """Select up to ``limit`` + 1 ``(user id, first name, upcoming events)`` rows.
+
+    ``kind`` is "followers" or "followed". Rows are ordered by user id and
+    start after ``after`` (keyset pagination); the extra row tells whether a
+    next page exists.
+    """
+    if kind == "followers":
+        mine, other = Friendship.followee_id, Friendship.follower_id
+    else:
+        mine, other = Friendship.follower_id, Friendship.followee_id
+    return (
+        select(other, User.first_name, func.coalesce(UpcomingCount.upcoming, 0))
+        .select_from(Friendship)
+        .join(User, User.id == other)
+        .outerjoin(UpcomingCount, UpcomingCount.owner_id == other)
+        .where(mine == uid, other > after)
+        .order_by(other)
+        .limit(limit + 1)
+    )
+
+
+def _people_page(uid: int, kind: str, after: int = 0, limit: int = PEOPLE_PAGE_SIZE):
+    with SessionLocal() as db:
+        return db.execute(_people_page_stmt(uid, kind, after, limit)).all()
+
+
+async def _people_page_async(uid: int, kind: str, after: int = 0, limit: int = PEOPLE_PAGE_SIZE):
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(_people_page_stmt(uid, kind, after, limit))).all()
+
+
+def _people_keyboard(uid: int, kind: str, after: int = 0, rows=None):
+    """Return (inline keyboard of one page of followers/followed, whether the page is empty).
+
+    Async callers pass ``rows=await _people_page_async(uid, kind, after)``.
+    """
+    if rows is None:
+        rows = _people_page(uid, kind, after)
+    kb = types.InlineKeyboardMarkup()
+    for fid, name, cnt in rows[:PEOPLE_PAGE_SIZE]:
+        kb.add(types.InlineKeyboardButton(f"{name} ({cnt})", callback_data=ucb(fid, "menu")))
+    nav = []
+    if after:
+        nav.append(types.InlineKeyboardButton("⏮ First", callback_data=f"ppl:{kind}:0"))
+    if len(rows) > PEOPLE_PAGE_SIZE:
+        nav.append(types.InlineKeyboardButton("More ▶", callback_data=f"ppl:{kind}:{rows[PEOPLE_PAGE_SIZE - 1][0]}"))
+    if nav:
+        kb.row(*nav)
+    return kb, not rows
 
 
 def register(bot):
-    def show_followers(chat_id: int, uid: int) -> None:
-        set_state(uid, "followers")
-        with SessionLocal() as db:
-            ids = db.scalars(select(Friendship.follower_id).where(Friendship.followee_id == uid)).all()
-            users = db.scalars(select(User).where(User.id.in_(ids))).all() if ids else []
-            today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-            kb = types.InlineKeyboardMarkup()
-            for u in users:
-                cnt = db.scalar(
-                    select(func.count()).select_from(Event).where(
-                        Event.owner_id == u.id,
-                        Event.state == EventState.Active,
-                        Event.datetime_utc >= today,
-                    )
-                )
-                kb.add(types.InlineKeyboardButton(f"{u.first_name} ({cnt})", callback_data=ucb(u.id, "menu")))
-        text = "<b>Followers:</b>"
-        if not users:
+    def show_people(chat_id: int, uid: int, kind: str) -> None:
+        set_state(uid, kind)
+        kb, empty = _people_keyboard(uid, kind)
+        text = f"<b>{PEOPLE_TITLES[kind]}:</b>"
+        if empty:
             text += "\n(none)"
         bot.send_message(chat_id, text, parse_mode="HTML", reply_markup=kb)
         bot.send_message(chat_id, "Options:", reply_markup=BACK_KB)
 
+    def show_followers(chat_id: int, uid: int) -> None:
+        show_people(chat_id, uid, "followers")
+
     def show_followed(chat_id: int, uid: int) -> None:
-        set_state(uid, "followed")
-        with SessionLocal() as db:
-            ids = db.scalars(select(Friendship.followee_id).where(Friendship.follower_id == uid)).all()
-            users = db.scalars(select(User).where(User.id.in_(ids))).all() if ids else []
-            today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-            kb = types.InlineKeyboardMarkup()
-            for u in users:
-                cnt = db.scalar(
-                    select(func.count()).select_from(Event).where(
-                        Event.owner_id == u.id,
-                        Event.state == EventState.Active,
-                        Event.datetime_utc >= today,
-                    )
-                )
-                kb.add(types.InlineKeyboardButton(f"{u.first_name} ({cnt})", callback_data=ucb(u.id, "menu")))
-        text = "<b>Followed:</b>"
-        if not users:
-            text += "\n(none)"
-        bot.send_message(chat_id, text, parse_mode="HTML", reply_markup=kb)
-        bot.send_message(chat_id, "Options:", reply_markup=BACK_KB)
+        show_people(chat_id, uid, "followed")
 
     def show_user_menu(chat_id: int, uid: int, friend_id: int, origin: str) -> None:
         with SessionLocal() as db:
             user = db.get(User, friend_id)
         name = user.first_name if user else str(friend_id)
-        USER_CTX[uid] = {"id": friend_id, "name": name, "origin": origin}
+        USER_CTX.set(uid, {"id": friend_id, "name": name, "origin": origin})
         set_state(uid, "friend_user")
         bot.send_message(chat_id, f"<b>{name}</b>", parse_mode="HTML", reply_markup=USER_KB)
 
@@ -84,14 +115,7 @@ def register(bot):
         name = ctx["name"]
         set_state(uid, "friend_events")
         today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-        with SessionLocal() as db:
-            events = db.scalars(
-                select(Event).where(
-                    Event.owner_id == fid,
-                    Event.state == EventState.Active,
-                    Event.datetime_utc >= today,
-                )
-            ).all()
+        events = _active_events(today, owners=[fid])
         text, ikb = _list_events(events)
         header = f"<b>{name}'s events:</b>"
         if text:
@@ -99,21 +123,21 @@ def register(bot):
         bot.send_message(chat_id, header, parse_mode="HTML", reply_markup=ikb)
         bot.send_message(chat_id, "Options:", reply_markup=LIST_KB)
 
-    @bot.message_handler(func=lambda m: m.text == "👥 Friends")
+    @ROUTER.message("👥 Friends")
     def friends_main(msg):
         uid = msg.from_user.id
         set_state(uid, "friends")
         bot.send_message(msg.chat.id, "Friends:", reply_markup=FRIENDS_KB)
 
-    @bot.message_handler(func=lambda m: m.text == "🙋 Followers")
+    @ROUTER.message("🙋 Followers")
     def followers(msg):
         show_followers(msg.chat.id, msg.from_user.id)
 
-    @bot.message_handler(func=lambda m: m.text == "👍 Followed")
+    @ROUTER.message("👍 Followed")
     def followed(msg):
         show_followed(msg.chat.id, msg.from_user.id)
 
-    @bot.callback_query_handler(func=lambda c: c.data.startswith("user:"))
+    @ROUTER.callback("user")
     def user_callback(c):
         _, uid_str, _, act = c.data.split(":")
         fid = int(uid_str)
@@ -122,10 +146,18 @@ def register(bot):
             show_user_menu(c.message.chat.id, c.from_user.id, fid, origin)
         bot.answer_callback_query(c.id)
 
-    @bot.message_handler(func=lambda m: m.text == "🚫 Unfollow")
-    def unfollow(msg):
-        if get_state(msg.from_user.id) != "friend_user":
+    @ROUTER.callback("ppl")
+    def people_page(c):
+        _, kind, after = c.data.split(":")
+        if kind not in PEOPLE_TITLES:
+            bot.answer_callback_query(c.id)
             return
+        kb, _ = _people_keyboard(c.from_user.id, kind, int(after))
+        bot.answer_callback_query(c.id)
+        bot.edit_message_reply_markup(c.message.chat.id, c.message.message_id, reply_markup=kb)
+
+    @ROUTER.message("🚫 Unfollow", states=("friend_user",))
+    def unfollow(msg):
         ctx = USER_CTX.get(msg.from_user.id)
         if not ctx:
             return
@@ -137,10 +169,8 @@ def register(bot):
                 db.commit()
         bot.reply_to(msg, "You have unfollowed this user.")
 
-    @bot.message_handler(func=lambda m: m.text == "🗑 Unfriend")
+    @ROUTER.message("🗑 Unfriend", states=("friend_user",))
     def unfriend(msg):
-        if get_state(msg.from_user.id) != "friend_user":
-            return
         ctx = USER_CTX.get(msg.from_user.id)
         if not ctx:
             return
@@ -155,73 +185,50 @@ def register(bot):
             db.commit()
         bot.reply_to(msg, "Friendship removed.")
 
-    @bot.message_handler(func=lambda m: m.text == "📅 Friend’s events")
+    @ROUTER.message("📅 Friend’s events", states=("friend_user",))
     def user_events(msg):
-        if get_state(msg.from_user.id) != "friend_user":
-            return
         show_friend_events(msg.chat.id, msg.from_user.id)
 
-    @bot.message_handler(func=lambda m: m.text == "📍 Show on map")
+    @ROUTER.message("📍 Show on map", states=("friend_events",))
     def show_on_map(msg):
-        if get_state(msg.from_user.id) != "friend_events":
-            return
         ctx = USER_CTX.get(msg.from_user.id)
         if not ctx:
             return
         fid = ctx["id"]
         today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-        with SessionLocal() as db:
-            events = db.scalars(
-                select(Event).where(
-                    Event.owner_id == fid,
-                    Event.state == EventState.Active,
-                    Event.datetime_utc >= today,
-                )
-            ).all()
+        events = _active_events(today, owners=[fid])
         from ..map_view import show_events_on_map
         show_events_on_map(bot, msg.chat.id, events)
 
-    @bot.message_handler(func=lambda m: m.text == "📍 Nearby")
+    @ROUTER.message("📍 Nearby", states=("friend_events",))
     def nearby_request(msg):
-        if get_state(msg.from_user.id) != "friend_events":
-            return
         set_state(msg.from_user.id, "friend_nearby_wait")
         kb = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
         kb.add(types.KeyboardButton("📍 Send my current location", request_location=True))
         kb.add("⬅️ Back")
         bot.send_message(msg.chat.id, "Send your location to see nearby events:", reply_markup=kb)
 
-    @bot.message_handler(content_types=["location"])
+    @ROUTER.message(states=("friend_nearby_wait",), content_types=("location",))
     def nearby_location(msg):
-        if get_state(msg.from_user.id) != "friend_nearby_wait":
-            return ContinueHandling()
         set_state(msg.from_user.id, "friend_events")
         ctx = USER_CTX.get(msg.from_user.id)
         if not ctx:
             return
         fid = ctx["id"]
         today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-        with SessionLocal() as db:
-            events = db.scalars(
-                select(Event).where(
-                    Event.owner_id == fid,
-                    Event.state == EventState.Active,
-                    Event.datetime_utc >= today,
-                )
-            ).all()
+        lat, lon = msg.location.latitude, msg.location.longitude
+        events = _active_events(today, owners=[fid], near=(lat, lon))
         from ..map_view import show_events_on_map, filter_nearby_events
-        nearby = filter_nearby_events(events, msg.location.latitude, msg.location.longitude)
+        nearby = filter_nearby_events(events, lat, lon)
         show_events_on_map(bot, msg.chat.id, nearby)
 
-    @bot.message_handler(func=lambda m: m.text == "🏠 Main menu")
+    @ROUTER.message("🏠 Main menu", states=("friend_user", "friend_events", "friend_nearby_wait"))
     def to_main(msg):
-        if get_state(msg.from_user.id) not in ("friend_user", "friend_events", "friend_nearby_wait"):
-            return
         from ..bot import MAIN_KB
         set_state(msg.from_user.id, "main")
         bot.send_message(msg.chat.id, "Main menu:", reply_markup=MAIN_KB)
 
-    @bot.message_handler(func=lambda m: m.text == "⬅️ Back")
+    @ROUTER.message("⬅️ Back", states=FRIENDS_STATES)
     def back(msg):
         uid = msg.from_user.id
         state = get_state(uid)
@@ -2,13 +2,16 @@ from telebot import types
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
 from sqlalchemy import select
 from ..database import SessionLocal
-from ..models import Event, Participation, EventState, Friendship
+from ..models import Friendship
 from ..helpers import cb
+from ..event_cards import get_card
+from ..participation import record_join, is_joined
+from ..router import ROUTER
 from .state import set_state
 
 
 def register(bot):
-    @bot.message_handler(regexp=r"^/start")
+    @ROUTER.message("/start")
     def handle_start_cmd(msg):
         parts = msg.text.split(maxsplit=1)
         user_id = msg.from_user.id
@@ -36,52 +39,35 @@ def register(bot):
 
         if param.startswith("desc_"):
             eid = param[5:]
-            with SessionLocal() as db:
-                ev = db.get(Event, eid)
-                if not ev or ev.state != EventState.Active:
-                    bot.send_message(user_id, "Event not found or not active.")
-                    return
-                make_friends(user_id, ev.owner_id)
+            card = get_card(eid)
+            if not card or not card.active:
+                bot.send_message(user_id, "Event not found or not active.")
+                return
+            make_friends(user_id, card.owner_id)
 
-                part = db.get(Participation, {"event_id": eid, "user_id": user_id})
-                inline_kb = InlineKeyboardMarkup()
-                if part:
-                    inline_kb.add(InlineKeyboardButton("Unjoin", callback_data=cb(eid, "unjoin")))
-                else:
-                    inline_kb.add(InlineKeyboardButton("Join", callback_data=cb(eid, "join")))
+            inline_kb = InlineKeyboardMarkup()
+            if is_joined(eid, user_id):
+                inline_kb.add(InlineKeyboardButton("Unjoin", callback_data=cb(eid, "unjoin")))
+            else:
+                inline_kb.add(InlineKeyboardButton("Join", callback_data=cb(eid, "join")))
 
-                text = (
-                    f"<b>{ev.title}</b>\n"
-                    f"{ev.description}\n\n"
-                    f"🗓️ {ev.datetime_utc:%Y-%m-%d %H:%M UTC}\n"
-                    f"📍 {ev.location_txt}"
-                )
-                bot.send_message(user_id, text, parse_mode="HTML", reply_markup=inline_kb)
+            bot.send_message(user_id, card.description, parse_mode="HTML", reply_markup=inline_kb)
             return
 
         if param.startswith("join_"):
             eid = param[5:]
-            with SessionLocal() as db:
-                ev = db.get(Event, eid)
-                if not ev or ev.state != EventState.Active:
-                    bot.send_message(user_id, "Event not found or not active.")
-                    return
-                make_friends(user_id, ev.owner_id)
+            card = get_card(eid)
+            if not card or not card.active:
+                bot.send_message(user_id, "Event not found or not active.")
+                return
+            make_friends(user_id, card.owner_id)
 
-                if not db.get(Participation, {"event_id": eid, "user_id": user_id}):
-                    db.add(Participation(event_id=eid, user_id=user_id))
-                    db.commit()
+            record_join(eid, user_id)
 
-                inline_kb = InlineKeyboardMarkup()
-                inline_kb.add(InlineKeyboardButton("Unjoin", callback_data=cb(eid, "unjoin")))
+            inline_kb = InlineKeyboardMarkup()
+            inline_kb.add(InlineKeyboardButton("Unjoin", callback_data=cb(eid, "unjoin")))
 
-                text = (
-                    f"<b>{ev.title}</b>\n"
-                    f"{ev.description}\n\n"
-                    f"🗓️ {ev.datetime_utc:%Y-%m-%d %H:%M UTC}\n"
-                    f"📍 {ev.location_txt}\n"
-                    f"✅ You have joined this event."
-                )
-                bot.send_message(user_id, text, parse_mode="HTML", reply_markup=inline_kb)
+            text = card.description + "\n✅ You have joined this event."
+            bot.send_message(user_id, text, parse_mode="HTML", reply_markup=inline_kb)
             return
 
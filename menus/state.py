@@ -1,7 +1,9 @@
-STATE = {}
+from ..session_store import namespace
+
+STATE = namespace("state")
 
 def set_state(uid: int, val: str):
-    STATE[uid] = val
+    STATE.set(uid, val)
 
 def get_state(uid: int) -> str:
     return STATE.get(uid, "main")
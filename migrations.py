@@ -0,0 +1,215 @@
+"""In-place schema upgrades for existing databases.
+
+``Base.metadata.create_all`` only creates missing tables. ``upgrade`` also adds
+columns and indexes introduced after a table was first created and fills in
+derived data. Every step is idempotent, so it runs on each start.
+
+``python -m invevent.migrations`` runs the event timestamp conversion on its
+own (in batches, e.g. ahead of a deploy) and verifies it.
+"""
+import argparse
+import logging
+import sys
+
+from sqlalchemy import Integer, inspect, insert, select, update, text
+from sqlalchemy.orm import Session
+
+from .database import Base, engine
+from .models import Event, EventTag, UpcomingCount, FeedItem, Friendship, event_tag_rows, to_epoch
+from .geo import geo_cell
+
+log = logging.getLogger(__name__)
+
+# table → [(column, SQL type)] added after the table first shipped
+_COLUMNS = {
+    "events": [("geo_cell", "INTEGER")],
+}
+
+
+def _add_missing_columns(conn) -> None:
+    insp = inspect(conn)
+    for table, columns in _COLUMNS.items():
+        existing = {c["name"] for c in insp.get_columns(table)}
+        for name, sql_type in columns:
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}"))
+
+
+def _create_missing_indexes(conn) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _backfill_geo_cells(bind, batch_size: int = 1000) -> None:
+    with Session(bind) as db:
+        while True:
+            rows = db.execute(
+                select(Event.id, Event.latitude, Event.longitude)
+                .where(Event.geo_cell.is_(None), Event.latitude.is_not(None), Event.longitude.is_not(None))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.execute(update(Event), [{"id": eid, "geo_cell": geo_cell(lat, lon)} for eid, lat, lon in rows])
+            db.commit()
+
+
+def _epoch_column(conn) -> bool:
+    col = next(c for c in inspect(conn).get_columns("events") if c["name"] == "datetime_utc")
+    return isinstance(col["type"], Integer)
+
+
+# PRAGMA user_version of a SQLite database whose event timestamps are converted
+_EPOCH_USER_VERSION = 1
+
+
+def _epoch_converted(conn) -> bool:
+    """True if ``events.datetime_utc`` needs no conversion: created as epoch seconds, or converted before."""
+    if _epoch_column(conn):
+        return True
+    return conn.dialect.name == "sqlite" and conn.scalar(text("PRAGMA user_version")) >= _EPOCH_USER_VERSION
+
+
+def normalize_event_timestamps(bind=engine, batch_size: int = 1000) -> int:
+    """Rewrite ``events.datetime_utc`` as UTC epoch seconds; return rows converted.
+
+    Before ``UTCEpoch``, values were DATETIME: strings on SQLite (naive or
+    with an offset, depending on who wrote them), which don't compare
+    correctly with each other or with the new integer bounds. SQLite
+    columns are converted row by row in ``batch_size`` transactions, then
+    ``PRAGMA user_version`` records that so later starts skip the scan. A
+    value that can't be parsed is logged and replaced by 0 (1970-01-01), so
+    the event drops out of every upcoming list instead of breaking reads.
+    PostgreSQL changes the column type in one statement.
+    """
+    name = bind.dialect.name
+    if name == "postgresql":
+        with bind.begin() as conn:
+            if _epoch_column(conn):
+                return 0
+            n = conn.scalar(text("SELECT count(*) FROM events"))
+            conn.execute(text(
+                "ALTER TABLE events ALTER COLUMN datetime_utc TYPE BIGINT "
+                "USING floor(extract(epoch FROM datetime_utc))::bigint"
+            ))
+        return n
+    if name != "sqlite":
+        with bind.connect() as conn:
+            if not _epoch_column(conn):
+                log.warning("events.datetime_utc on %s must be converted to epoch seconds by hand", name)
+        return 0
+    with bind.connect() as conn:
+        if _epoch_converted(conn):
+            return 0
+    converted, after = 0, ""
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, datetime_utc FROM events "
+                "WHERE typeof(datetime_utc) NOT IN ('integer', 'null') AND id > :after "
+                "ORDER BY id LIMIT :n"
+            ), {"after": after, "n": batch_size}).all()
+            if not rows:
+                break
+            params = []
+            for eid, raw in rows:
+                try:
+                    params.append({"eid": eid, "ts": to_epoch(raw)})
+                except (TypeError, ValueError):
+                    log.error("Event %s has an unreadable datetime_utc %r; setting it to 0", eid, raw)
+                    params.append({"eid": eid, "ts": 0})
+            conn.execute(text("UPDATE events SET datetime_utc = :ts WHERE id = :eid"), params)
+        converted += len(params)
+        after = rows[-1][0]
+    with bind.begin() as conn:
+        conn.execute(text(f"PRAGMA user_version = {_EPOCH_USER_VERSION}"))
+    if converted:
+        log.info("Converted %d event timestamps to epoch seconds", converted)
+    return converted
+
+
+def unconverted_event_timestamps(bind=engine) -> int:
+    """Return how many events still hold a ``datetime_utc`` that is not epoch seconds."""
+    with bind.connect() as conn:
+        if bind.dialect.name == "sqlite":
+            return conn.scalar(text(
+                "SELECT count(*) FROM events WHERE typeof(datetime_utc) NOT IN ('integer', 'null')"
+            ))
+        if _epoch_column(conn):
+            return 0
+        return conn.scalar(text("SELECT count(*) FROM events"))
+
+
+def _backfill_event_tags(bind, batch_size: int = 1000) -> None:
+    # event_tags is empty right after the table is introduced. One transaction
+    # for all batches: an interrupted backfill leaves it empty and reruns.
+    with Session(bind) as db:
+        if db.scalar(select(EventTag.event_id).limit(1)) is not None:
+            return
+        after = ""
+        while True:
+            events = db.execute(
+                select(Event.id, Event.tags, Event.datetime_utc)
+                .where(Event.id > after, Event.tags != "")
+                .order_by(Event.id)
+                .limit(batch_size)
+            ).all()
+            if not events:
+                break
+            rows = [row for e in events for row in event_tag_rows(e.id, e.tags, e.datetime_utc)]
+            if rows:
+                db.execute(insert(EventTag), rows)
+            after = events[-1].id
+        db.commit()
+
+
+def _backfill_upcoming_counts(bind) -> None:
+    # counters are empty right after the table is introduced
+    with Session(bind) as db:
+        if db.scalar(select(UpcomingCount.owner_id).limit(1)) is not None:
+            return
+    from .event_counters import reconcile
+    reconcile()
+
+
+def _backfill_feeds(bind) -> None:
+    # feeds are empty right after the table is introduced
+    with Session(bind) as db:
+        if db.scalar(select(FeedItem.user_id).limit(1)) is not None:
+            return
+        if db.scalar(select(Friendship.follower_id).limit(1)) is None:
+            return
+    from .feed import rebuild
+    rebuild()
+
+
+def upgrade(bind=engine) -> None:
+    """Bring the database schema at ``bind`` up to date with the models."""
+    Base.metadata.create_all(bind)
+    with bind.begin() as conn:
+        _add_missing_columns(conn)
+        _create_missing_indexes(conn)
+    # before the backfills below, which compare event dates
+    normalize_event_timestamps(bind)
+    _backfill_geo_cells(bind)
+    _backfill_event_tags(bind)
+    _backfill_upcoming_counts(bind)
+    _backfill_feeds(bind)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Convert stored event timestamps to UTC epoch seconds")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per transaction")
+    parser.add_argument("--verify", action="store_true", help="only count events not converted yet")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    if not args.verify:
+        normalize_event_timestamps(engine, args.batch_size)
+    left = unconverted_event_timestamps(engine)
+    print(f"{left} events with unconverted datetime_utc")
+    return 1 if left else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
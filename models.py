@@ -1,12 +1,48 @@
 
-from datetime import datetime, timezone
+import math
+from datetime import date, datetime, timezone
 from typing import Optional
 from enum import Enum as PyEnum
-from sqlalchemy import String,Integer,DateTime,ForeignKey,Text,Enum as SAEnum
-from sqlalchemy import Float
-from sqlalchemy.orm import Mapped,mapped_column
+from sqlalchemy import String,Integer,BigInteger,DateTime,Date,ForeignKey,Text,Enum as SAEnum
+from sqlalchemy import Float, Index
+from sqlalchemy.types import TypeDecorator
+from collections import Counter
+from sqlalchemy.orm import Mapped,mapped_column,Session
+from sqlalchemy import inspect as sa_inspect, update as sa_update, insert as sa_insert, delete as sa_delete
 from sqlalchemy import event
 from .database import Base
+from .geo import geo_cell
+
+def to_epoch(value) -> int:
+    """Return whole UTC epoch seconds of a datetime (naive means UTC) or ISO string."""
+    if isinstance(value, (int, float)):
+        return math.floor(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return math.floor(value.timestamp())
+
+
+class UTCEpoch(TypeDecorator):
+    """Timezone-aware UTC datetime stored as integer epoch seconds.
+
+    Integers sort and compare the same in SQL as in Python, whatever
+    timezone or string format a value arrived in. ``migrations`` converts
+    values stored as DATETIME before this type was introduced.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_epoch(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return datetime.fromtimestamp(to_epoch(value), timezone.utc)
+
 
 class User(Base):
     __tablename__="users"
@@ -29,7 +65,7 @@ class Event(Base):
     owner_id:Mapped[int]=mapped_column(Integer,ForeignKey("users.id"))
     title:Mapped[str]=mapped_column(String(80))
     description:Mapped[str]=mapped_column(Text)
-    datetime_utc:Mapped[datetime]=mapped_column(DateTime(timezone=True))
+    datetime_utc:Mapped[datetime]=mapped_column(UTCEpoch)
     
     # location_txt:Mapped[str]=mapped_column(String(120))
     location_txt:Mapped[Optional[str]]=mapped_column(String(120), nullable=True)
@@ -42,6 +78,25 @@ class Event(Base):
     latitude:Mapped[Optional[float]]  = mapped_column(Float, nullable=True)
     longitude:Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     address:Mapped[Optional[str]]     = mapped_column(String(120), nullable=True)
+    # Spatial grid cell of (latitude, longitude), maintained automatically
+    geo_cell:Mapped[Optional[int]]    = mapped_column(Integer, nullable=True)
+
+    __table_args__=(
+        Index("ix_events_geo_cell_dt","geo_cell","datetime_utc"),
+        Index("ix_events_state_dt","state","datetime_utc"),
+        Index("ix_events_owner_state_dt","owner_id","state","datetime_utc"),
+    )
+
+class EventTag(Base):
+    """One tag of an event with the event's time, kept in sync on flush for per-topic listing."""
+    __tablename__="event_tags"
+    event_id:Mapped[str]=mapped_column(String(36),ForeignKey("events.id"),primary_key=True)
+    tag:Mapped[str]=mapped_column(String(40),primary_key=True)
+    datetime_utc:Mapped[datetime]=mapped_column(UTCEpoch)
+
+    __table_args__=(
+        Index("ix_event_tags_tag_dt","tag","datetime_utc","event_id"),
+    )
 
 class Participation(Base):
     __tablename__="participations"
@@ -55,18 +110,173 @@ class Friendship(Base):
     followee_id:Mapped[int]=mapped_column(Integer,ForeignKey("users.id"),primary_key=True)
     created_at:Mapped[datetime]=mapped_column(DateTime(timezone=True),default=lambda: datetime.utcnow())
 
+    # the primary key serves lookups by follower; this one serves followers lists
+    __table_args__=(
+        Index("ix_friendships_followee","followee_id","follower_id"),
+    )
+
+class UpcomingCount(Base):
+    """Number of an owner's active events dated today or later, kept up to date on flush."""
+    __tablename__="upcoming_event_counts"
+    owner_id:Mapped[int]=mapped_column(Integer,ForeignKey("users.id"),primary_key=True)
+    upcoming:Mapped[int]=mapped_column(Integer,default=0)
+
+class FeedItem(Base):
+    """Event of a followed user, fanned out to the follower's feed for the event's UTC day."""
+    __tablename__="feed_items"
+    user_id:Mapped[int]=mapped_column(Integer,ForeignKey("users.id"),primary_key=True)
+    day:Mapped[date]=mapped_column(Date,primary_key=True)
+    event_id:Mapped[str]=mapped_column(String(36),ForeignKey("events.id"),primary_key=True)
+
+class GeocodeCache(Base):
+    """Nominatim result for a normalized address; NULL coordinates mean "not found"."""
+    __tablename__="geocode_cache"
+    address:Mapped[str]=mapped_column(String(255),primary_key=True)
+    latitude:Mapped[Optional[float]]=mapped_column(Float,nullable=True)
+    longitude:Mapped[Optional[float]]=mapped_column(Float,nullable=True)
+    fetched_at:Mapped[datetime]=mapped_column(DateTime(timezone=True),default=lambda: datetime.now(timezone.utc))
+
+class SessionState(Base):
+    """JSON-encoded session value of one user (or map) key in a namespace."""
+    __tablename__="session_state"
+    namespace:Mapped[str]=mapped_column(String(32),primary_key=True)
+    key:Mapped[str]=mapped_column(String(64),primary_key=True)
+    value:Mapped[str]=mapped_column(Text)
+    expires_at:Mapped[float]=mapped_column(Float,index=True)
+
+class MediaFile(Base):
+    """Telegram ``file_id`` of an already uploaded file, keyed by content hash."""
+    __tablename__="media_files"
+    content_hash:Mapped[str]=mapped_column(String(64),primary_key=True)
+    kind:Mapped[str]=mapped_column(String(16))
+    file_id:Mapped[str]=mapped_column(String(255))
+
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-# Older databases might contain naive timestamps for ``Event.datetime_utc``.
-# When an ``Event`` object is loaded, ensure this field is timezone-aware to
-# avoid ``TypeError`` during comparisons.
+@event.listens_for(Event, "before_insert")
+@event.listens_for(Event, "before_update")
+def _event_set_geo_cell(_mapper, _connection, target) -> None:
+    target.geo_cell = geo_cell(target.latitude, target.longitude)
+
+
+def split_tags(tags) -> list:
+    """Return the distinct, trimmed tags of a comma-joined ``Event.tags`` value."""
+    return list(dict.fromkeys(t.strip()[:40] for t in (tags or "").split(",") if t.strip()))
+
+
+def event_tag_rows(event_id: str, tags, dt) -> list:
+    return [{"event_id": event_id, "tag": tag, "datetime_utc": dt} for tag in split_tags(tags)]
+
+
+@event.listens_for(Session, "before_flush")
+def _drop_deleted_event_tags(session, _flush_context, _instances) -> None:
+    # before the events are deleted, so the foreign key holds
+    ids = [target.id for target in session.deleted if isinstance(target, Event)]
+    if ids:
+        table = EventTag.__table__
+        session.connection().execute(sa_delete(table).where(table.c.event_id.in_(ids)))
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_event_tags(session, _flush_context) -> None:
+    """Write ``event_tags`` rows of new events and of events whose tags or time changed."""
+    rows = []
+    for target in session.new:
+        if isinstance(target, Event):
+            rows += event_tag_rows(target.id, target.tags, target.datetime_utc)
+    changed = []
+    for target in session.dirty:
+        if not isinstance(target, Event) or target in session.deleted:
+            continue
+        attrs = sa_inspect(target).attrs
+        if attrs.tags.history.has_changes() or attrs.datetime_utc.history.has_changes():
+            changed.append(target.id)
+            rows += event_tag_rows(target.id, target.tags, target.datetime_utc)
+    table = EventTag.__table__
+    if changed:
+        session.connection().execute(sa_delete(table).where(table.c.event_id.in_(changed)))
+    if rows:
+        session.connection().execute(sa_insert(table), rows)
+
+
+def today_start_utc() -> datetime:
+    """Midnight UTC of the current day; events from then on count as upcoming."""
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _is_upcoming(state, dt, today) -> bool:
+    # a pending insert has no state yet when the column default applies
+    if state not in (None, EventState.Active) or dt is None:
+        return False
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt >= today
+
+
+def _committed(target, attr):
+    hist = sa_inspect(target).attrs[attr].history
+    if hist.deleted:
+        return hist.deleted[0]
+    return getattr(target, attr)
+
+
+def _add_to_count(dialect: str, owner_id: int, delta: int):
+    """Return an upsert adding ``delta`` to ``owner_id``'s counter on ``dialect``, or None if unsupported.
+
+    A single statement, so two flushes creating an owner's first events
+    at the same time can't both try to insert the row.
+    """
+    table = UpcomingCount.__table__
+    row = {"owner_id": owner_id, "upcoming": max(delta, 0)}
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(table).values(row).on_conflict_do_update(
+            index_elements=[table.c.owner_id], set_={"upcoming": table.c.upcoming + delta}
+        )
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        return dialect_insert(table).values(row).on_duplicate_key_update(upcoming=table.c.upcoming + delta)
+    return None
 
-@event.listens_for(Event, "load")
-def _event_fix_naive_dt(target, _context) -> None:
-    dt = target.datetime_utc
-    if dt is not None and dt.tzinfo is None:
-        target.datetime_utc = dt.replace(tzinfo=timezone.utc)
 
+@event.listens_for(Session, "after_flush")
+def _maintain_upcoming_counts(session, _flush_context) -> None:
+    """Apply the flushed Event changes to ``UpcomingCount`` in the same transaction."""
+    today = today_start_utc()
+    deltas = Counter()
+    for target in session.new:
+        if isinstance(target, Event) and _is_upcoming(target.state, target.datetime_utc, today):
+            deltas[target.owner_id] += 1
+    for target in session.deleted:
+        if isinstance(target, Event) and _is_upcoming(
+            _committed(target, "state"), _committed(target, "datetime_utc"), today
+        ):
+            deltas[_committed(target, "owner_id")] -= 1
+    for target in session.dirty:
+        if not isinstance(target, Event) or target in session.deleted:
+            continue
+        if _is_upcoming(_committed(target, "state"), _committed(target, "datetime_utc"), today):
+            deltas[_committed(target, "owner_id")] -= 1
+        if _is_upcoming(target.state, target.datetime_utc, today):
+            deltas[target.owner_id] += 1
+    conn = session.connection()
+    for owner_id, delta in deltas.items():
+        if not delta:
+            continue
+        stmt = _add_to_count(conn.dialect.name, owner_id, delta)
+        if stmt is not None:
+            conn.execute(stmt)
+            continue
+        # unknown dialect: update, insert the row if there was none
+        table = UpcomingCount.__table__
+        updated = conn.execute(
+            sa_update(table).where(table.c.owner_id == owner_id).values(upcoming=table.c.upcoming + delta)
+        ).rowcount
+        if not updated:
+            conn.execute(sa_insert(table).values(owner_id=owner_id, upcoming=max(delta, 0)))
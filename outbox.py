@@ -0,0 +1,387 @@
+"""Rate-limited outbound queue for Bot API sends.
+
+Handlers used to call ``bot.send_message`` synchronously, often twice in a
+row (a header, then the "Menu:"/"Options:" keyboard), with nothing keeping
+them under Telegram's limits. With ``OutboxMixin`` the chat-bound send and
+edit methods put a job on the chat's queue and return a
+``concurrent.futures.Future`` of the resulting ``Message`` right away.
+
+``OUTBOX_WORKERS`` sender threads drain the queues:
+
+* every chat has a token bucket (``OUTBOX_CHAT_RATE`` per second, bursts of
+  ``OUTBOX_CHAT_BURST``; groups ``OUTBOX_GROUP_RATE_PER_MIN`` per minute)
+  and all sends share a global one (``OUTBOX_GLOBAL_RATE`` per second);
+* jobs of one chat are sent in order, one at a time;
+* a 429 puts the job back at the head of its chat's queue for the
+  ``retry_after`` Telegram asked for, up to ``OUTBOX_MAX_RETRIES`` times,
+  with file arguments rewound (a file that can't be rewound fails the job);
+* consecutive plain texts to a chat are merged into one message when only
+  the last carries a keyboard, they share options and fit into 4096
+  characters. A chat's first job waits ``OUTBOX_COALESCE_DELAY`` seconds so
+  the rest of a handler's messages can join it. Pass ``coalesce=False`` to
+  ``send_message`` for a message that is edited or deleted later, so it is
+  sent on its own.
+
+The threads run once ``Outbox.start()`` is called. With ``OUTBOX_WORKERS=0``
+the methods send synchronously as before.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+from .config import (
+    OUTBOX_WORKERS, OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST,
+    OUTBOX_GROUP_RATE_PER_MIN, OUTBOX_COALESCE_DELAY, OUTBOX_MAX_RETRIES,
+)
+
+log = logging.getLogger(__name__)
+
+MAX_TEXT = 4096
+# send_message options under which consecutive texts may be merged
+_MERGEABLE = {"parse_mode", "reply_markup", "disable_notification", "disable_web_page_preview"}
+
+
+def _options(kwargs) -> dict:
+    return {k: v for k, v in kwargs.items() if k not in ("parse_mode", "reply_markup")}
+
+
+def _rewind(job) -> bool:
+    """Seek the file-like arguments of ``job`` back to the start; False if one can't be."""
+    for value in itertools.chain(job.args, job.kwargs.values()):
+        if hasattr(value, "read"):
+            try:
+                value.seek(0)
+            except Exception:
+                return False
+    return True
+
+
+class TokenBucket:
+    """``rate`` tokens per second, at most ``burst`` saved up. Callers lock."""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _Job:
+    __slots__ = ("method", "args", "kwargs", "future", "attempts", "coalesce")
+
+    def __init__(self, method, args, kwargs, coalesce=True):
+        self.method = method
+        self.coalesce = coalesce
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.attempts = 0
+
+
+class _Chat:
+    __slots__ = ("jobs", "bucket", "scheduled")
+
+    def __init__(self, bucket):
+        self.jobs = deque()
+        self.bucket = bucket
+        self.scheduled = False  # in the ready heap or being sent
+
+
+class Outbox:
+    """Per-chat ordered, rate-limited, coalescing send queue of one bot."""
+
+    def __init__(self, bot, workers: int = OUTBOX_WORKERS):
+        self._bot = bot
+        self._cond = threading.Condition()
+        self._chats = {}
+        self._ready = []  # heap of (not_before, seq, chat_id)
+        self._seq = itertools.count()
+        self._global = TokenBucket(OUTBOX_GLOBAL_RATE, OUTBOX_GLOBAL_RATE)
+        self._pending = 0
+        self._submits = 0
+        self._stopped = False
+        self._stats = {"queued": 0, "sent": 0, "coalesced": 0, "retried": 0, "failed": 0}
+        self._workers = max(1, workers)
+        self._threads = []
+
+    def start(self) -> None:
+        """Start the sender threads (once); jobs submitted before wait in their queue."""
+        with self._cond:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True) for i in range(self._workers)
+            ]
+        for t in self._threads:
+            t.start()
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        if isinstance(chat_id, int) and chat_id < 0:
+            rate = OUTBOX_GROUP_RATE_PER_MIN / 60
+            return TokenBucket(rate, max(1.0, min(OUTBOX_CHAT_BURST, OUTBOX_GROUP_RATE_PER_MIN)))
+        return TokenBucket(OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST)
+
+    def _schedule(self, chat_id, at: float) -> None:
+        heapq.heappush(self._ready, (at, next(self._seq), chat_id))
+        self._cond.notify()
+
+    def submit(self, chat_id, method: str, args: tuple, kwargs: dict, coalesce: bool = True) -> Future:
+        """Queue ``TeleBot.<method>(*args, **kwargs)`` for ``chat_id``; return a Future of its result.
+
+        With ``coalesce=False`` the job is never merged with its neighbours.
+        """
+        job = _Job(method, args, kwargs, coalesce)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("outbox is stopped")
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = _Chat(self._bucket(chat_id))
+            chat.jobs.append(job)
+            self._pending += 1
+            self._stats["queued"] += 1
+            if not chat.scheduled:
+                chat.scheduled = True
+                self._schedule(chat_id, time.monotonic() + OUTBOX_COALESCE_DELAY)
+            self._submits += 1
+            if self._submits % 1024 == 0:
+                self._sweep()
+        return job.future
+
+    def _sweep(self) -> None:
+        """Forget idle chats whose bucket has refilled."""
+        now = time.monotonic()
+        idle = [cid for cid, c in self._chats.items() if not c.scheduled and not c.jobs and c.bucket.full(now)]
+        for cid in idle:
+            del self._chats[cid]
+
+    def _mergeable(self, batch, job) -> bool:
+        first, last = batch[0], batch[-1]
+        if not job.coalesce or job.method != "send_message" or last.kwargs.get("reply_markup") is not None:
+            return False
+        if not set(job.kwargs) <= _MERGEABLE:
+            return False
+        if _options(job.kwargs) != _options(first.kwargs):
+            return False
+        default = self._bot.parse_mode
+        if (job.kwargs.get("parse_mode") or default) != (first.kwargs.get("parse_mode") or default):
+            return False
+        length = sum(len(j.args[1]) + 2 for j in batch) + len(job.args[1])
+        return length <= MAX_TEXT
+
+    def _take_batch(self, chat: _Chat) -> list:
+        batch = [chat.jobs.popleft()]
+        head = batch[0]
+        if head.coalesce and head.method == "send_message" and set(head.kwargs) <= _MERGEABLE:
+            while chat.jobs and self._mergeable(batch, chat.jobs[0]):
+                batch.append(chat.jobs.popleft())
+        return batch
+
+    def _next(self):
+        """Block until a chat may send; return (chat_id, jobs), or None once stopped and empty."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._ready and self._ready[0][0] <= now:
+                    _, _, chat_id = heapq.heappop(self._ready)
+                    chat = self._chats[chat_id]
+                    wait = max(chat.bucket.delay(now), self._global.delay(now))
+                    if wait > 0:
+                        self._schedule(chat_id, now + wait)
+                        continue
+                    chat.bucket.take(now)
+                    self._global.take(now)
+                    return chat_id, self._take_batch(chat)
+                if self._stopped and self._pending == 0:
+                    return None
+                self._cond.wait(self._ready[0][0] - now if self._ready else None)
+
+    def _run(self) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            self._send(*item)
+
+    def _send(self, chat_id, jobs) -> None:
+        head = jobs[0]
+        args, kwargs = head.args, head.kwargs
+        if len(jobs) > 1:
+            text = "\n\n".join(j.args[1] for j in jobs)
+            args = (args[0], text)
+            kwargs = dict(head.kwargs, parse_mode=head.kwargs.get("parse_mode"),
+                          reply_markup=jobs[-1].kwargs.get("reply_markup"))
+        retry_at = None
+        try:
+            result = getattr(TeleBot, head.method)(self._bot, *args, **kwargs)
+        except ApiTelegramException as e:
+            attempts = max(j.attempts for j in jobs) + 1
+            # the failed attempt may have read an upload to the end
+            if e.error_code != 429 or attempts > OUTBOX_MAX_RETRIES or not _rewind(head):
+                self._settle(jobs, error=e)
+                log.warning("%s to %s failed: %s", head.method, chat_id, e.description)
+            else:
+                retry_after = ((e.result_json or {}).get("parameters") or {}).get("retry_after", 1)
+                log.warning("Rate limited on %s, retrying in %ss", chat_id, retry_after)
+                for j in jobs:
+                    j.attempts = attempts
+                retry_at = time.monotonic() + retry_after
+        except Exception as e:
+            self._settle(jobs, error=e)
+            log.warning("%s to %s failed: %s", head.method, chat_id, e)
+        else:
+            self._settle(jobs, result=result)
+        with self._cond:
+            chat = self._chats[chat_id]
+            if retry_at is not None:
+                chat.jobs.extendleft(reversed(jobs))
+                self._stats["retried"] += 1
+                self._schedule(chat_id, retry_at)
+            elif chat.jobs:
+                self._schedule(chat_id, time.monotonic())
+            else:
+                chat.scheduled = False
+            self._cond.notify_all()
+
+    def _settle(self, jobs, result=None, error=None) -> None:
+        with self._cond:
+            self._pending -= len(jobs)
+            if error is None:
+                self._stats["sent"] += 1
+                self._stats["coalesced"] += len(jobs) - 1
+            else:
+                self._stats["failed"] += len(jobs)
+        for j in jobs:
+            if error is None:
+                j.future.set_result(result)
+            else:
+                j.future.set_exception(error)
+
+    def stats(self) -> dict:
+        """Return counters and the number of jobs waiting to be sent."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = self._pending
+            stats["chats"] = len(self._chats)
+        return stats
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until every queued job is settled; False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def stop(self, timeout: float = 30.0) -> bool:
+        """Send what is queued, then stop the sender threads."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        return not any(t.is_alive() for t in self._threads)
+
+
+class OutboxMixin:
+    """Route a ``TeleBot``'s chat-bound sends and edits through an ``Outbox``.
+
+    These methods then return a ``Future`` of the ``Message``; use
+    ``resolve``/``after_send`` where the result is needed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outbox = Outbox(self) if OUTBOX_WORKERS > 0 else None
+
+    def _enqueue(self, method: str, chat_id, args: tuple, kwargs: dict, coalesce: bool = True):
+        if self.outbox is None or chat_id is None:
+            return getattr(TeleBot, method)(self, *args, **kwargs)
+        return self.outbox.submit(chat_id, method, args, kwargs, coalesce)
+
+    def send_message(self, chat_id, text, coalesce: bool = True, **kwargs):
+        return self._enqueue("send_message", chat_id, (chat_id, text), kwargs, coalesce)
+
+    def send_photo(self, chat_id, photo, **kwargs):
+        return self._enqueue("send_photo", chat_id, (chat_id, photo), kwargs)
+
+    def send_document(self, chat_id, document, **kwargs):
+        return self._enqueue("send_document", chat_id, (chat_id, document), kwargs)
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return self._enqueue("edit_message_text", chat_id, (text, chat_id, message_id), kwargs)
+
+    def edit_message_reply_markup(self, chat_id=None, message_id=None, **kwargs):
+        return self._enqueue("edit_message_reply_markup", chat_id, (chat_id, message_id), kwargs)
+
+    def delete_message(self, chat_id, message_id, **kwargs):
+        return self._enqueue("delete_message", chat_id, (chat_id, message_id), kwargs)
+
+
+def resolve(sent, timeout=None):
+    """Return the ``Message`` of a send, waiting if it is still queued."""
+    return sent.result(timeout) if isinstance(sent, Future) else sent
+
+
+def after_send(send, on_sent=None, on_error=None):
+    """Call ``send()`` and hand its ``Message`` to ``on_sent``, or its
+    ``ApiTelegramException`` to ``on_error``, whether the bot queues sends or not.
+
+    Queued sends run the callbacks on the outbox thread. Returns what ``send``
+    returned (None if it raised and ``on_error`` handled it).
+    """
+    try:
+        sent = send()
+    except ApiTelegramException as e:
+        if on_error is None:
+            raise
+        on_error(e)
+        return None
+    if not isinstance(sent, Future):
+        if on_sent is not None:
+            on_sent(sent)
+        return sent
+
+    def done(fut):
+        exc = fut.exception()
+        try:
+            if exc is None:
+                if on_sent is not None:
+                    on_sent(fut.result())
+            elif on_error is not None and isinstance(exc, ApiTelegramException):
+                on_error(exc)
+        except Exception:
+            log.exception("Send callback failed")
+
+    sent.add_done_callback(done)
+    return sent
@@ -0,0 +1,221 @@
+"""Idempotent participation writes.
+
+Joining an event is an ``INSERT … ON CONFLICT DO NOTHING`` (``INSERT IGNORE``
+on MySQL), so double taps and concurrent deep-link joins neither raise
+``IntegrityError`` nor need a read before the write.
+
+With ``PARTICIPATION_WRITE_BEHIND`` enabled, joins are collected in a
+``JoinBuffer`` and written by a background thread every
+``PARTICIPATION_FLUSH_INTERVAL`` seconds (or as soon as
+``PARTICIPATION_BATCH`` joins are pending) as one multi-row insert, which
+turns a join storm on a popular event into a handful of transactions.
+``is_joined`` consults the buffer as well, so users see their own join right
+away. A batch that fails ``MAX_BATCH_ATTEMPTS`` times in a row is written
+join by join instead, and joins that still fail (e.g. for a deleted event)
+are logged and dropped.
+"""
+import logging
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from .config import PARTICIPATION_WRITE_BEHIND, PARTICIPATION_FLUSH_INTERVAL, PARTICIPATION_BATCH
+from .database import SessionLocal, engine
+from .models import Participation
+
+log = logging.getLogger(__name__)
+
+MAX_BATCH_ATTEMPTS = 3
+
+
+def _insert_ignore(bind=engine):
+    """Return an INSERT for participations that skips existing rows on ``bind``'s dialect."""
+    table = Participation.__table__
+    name = bind.dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert(table).on_conflict_do_nothing()
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(table).on_conflict_do_nothing()
+    if name in ("mysql", "mariadb"):
+        return insert(table).prefix_with("IGNORE")
+    return None
+
+
+def join_many(pairs) -> int:
+    """Insert ``(event_id, user_id)`` participations, skipping existing ones; return rows added."""
+    now = datetime.now(timezone.utc)
+    rows = [{"event_id": eid, "user_id": uid, "joined_at": now} for eid, uid in dict.fromkeys(pairs)]
+    if not rows:
+        return 0
+    stmt = _insert_ignore()
+    with SessionLocal() as db:
+        if stmt is not None:
+            added = db.execute(stmt, rows).rowcount
+            db.commit()
+            return max(added, 0)
+        # unknown dialect: insert row by row and ignore duplicates
+        added = 0
+        for row in rows:
+            try:
+                db.execute(insert(Participation.__table__), row)
+                db.commit()
+                added += 1
+            except IntegrityError:
+                db.rollback()
+        return added
+
+
+def join(event_id: str, user_id: int) -> bool:
+    """Make ``user_id`` a participant of ``event_id``; return False if already joined."""
+    return join_many([(event_id, user_id)]) > 0
+
+
+class JoinBuffer:
+    """Write-behind buffer coalescing joins into batched inserts."""
+
+    def __init__(self, interval: float = PARTICIPATION_FLUSH_INTERVAL, batch: int = PARTICIPATION_BATCH):
+        self.interval = interval
+        self.batch = batch
+        self._pending = {}  # (event_id, user_id) → None, insertion ordered
+        self._cond = threading.Condition()
+        # held while pending joins are written, so a leave can't overtake a join
+        self.write_lock = threading.Lock()
+        self._stopped = False
+        self._failures = 0  # failed batch writes in a row
+        self._thread = None
+
+    def start(self) -> None:
+        """Start the writer thread; ``add`` starts it on first use otherwise."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="join-buffer", daemon=True)
+        self._thread.start()
+
+    def add(self, event_id: str, user_id: int) -> None:
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            self._pending[(event_id, user_id)] = None
+            if len(self._pending) >= self.batch:
+                self._cond.notify()
+
+    def discard(self, event_id: str, user_id: int) -> bool:
+        with self._cond:
+            if (event_id, user_id) not in self._pending:
+                return False
+            del self._pending[(event_id, user_id)]
+            return True
+
+    def pending(self, event_id: str, user_id: int) -> bool:
+        with self._cond:
+            return (event_id, user_id) in self._pending
+
+    def flush(self) -> int:
+        """Write all pending joins now; return rows added."""
+        with self.write_lock:
+            with self._cond:
+                pairs, self._pending = list(self._pending), {}
+            if not pairs:
+                return 0
+            # group per event so each statement touches one event's rows
+            pairs.sort(key=lambda p: p[0])
+            try:
+                added = join_many(pairs)
+            except Exception:
+                self._failures += 1
+                if self._failures < MAX_BATCH_ATTEMPTS:
+                    log.exception("Flushing %d joins failed; retrying later", len(pairs))
+                    with self._cond:
+                        for pair in pairs:
+                            self._pending.setdefault(pair, None)
+                    return 0
+                log.exception("Flushing %d joins failed %d times; writing them one by one",
+                              len(pairs), self._failures)
+                added = self._write_each(pairs)
+            self._failures = 0
+            return added
+
+    @staticmethod
+    def _write_each(pairs) -> int:
+        added = 0
+        for event_id, user_id in pairs:
+            try:
+                added += join_many([(event_id, user_id)])
+            except Exception as e:
+                log.error("Dropping join of user %s to event %s: %s", user_id, event_id, e)
+        return added
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._stopped and len(self._pending) < self.batch:
+                    self._cond.wait(self.interval)
+                stopped = self._stopped
+            self.flush()
+            if stopped:
+                return
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush what is pending and stop the writer thread."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is None:
+            self.flush()
+        else:
+            self._thread.join(timeout)
+
+
+JOIN_BUFFER = JoinBuffer() if PARTICIPATION_WRITE_BEHIND else None
+
+
+def record_join(event_id: str, user_id: int) -> None:
+    """Join now, or through the write-behind buffer when it is enabled."""
+    if JOIN_BUFFER is not None:
+        JOIN_BUFFER.add(event_id, user_id)
+    else:
+        join(event_id, user_id)
+
+
+def leave(event_id: str, user_id: int) -> bool:
+    """Remove ``user_id`` from ``event_id`` (including a buffered join); return True if they were in."""
+    if JOIN_BUFFER is None:
+        return _delete(event_id, user_id)
+    with JOIN_BUFFER.write_lock:
+        was_pending = JOIN_BUFFER.discard(event_id, user_id)
+        return _delete(event_id, user_id) or was_pending
+
+
+def _delete(event_id: str, user_id: int) -> bool:
+    with SessionLocal() as db:
+        removed = db.execute(
+            delete(Participation).where(Participation.event_id == event_id, Participation.user_id == user_id)
+        ).rowcount
+        db.commit()
+    return removed > 0
+
+
+def is_joined(event_id: str, user_id: int) -> bool:
+    if JOIN_BUFFER is not None and JOIN_BUFFER.pending(event_id, user_id):
+        return True
+    with SessionLocal() as db:
+        return db.scalar(
+            select(Participation.user_id).where(
+                Participation.event_id == event_id, Participation.user_id == user_id
+            )
+        ) is not None
+
+
+def start() -> None:
+    if JOIN_BUFFER is not None:
+        JOIN_BUFFER.start()
+
+
+def stop() -> None:
+    if JOIN_BUFFER is not None:
+        JOIN_BUFFER.stop()
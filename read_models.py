@@ -0,0 +1,54 @@
+"""Lightweight read models for list and map views.
+
+Event lists and maps show a handful of columns per event. ``EventRow`` holds
+just those and is built from a projected column query. Nothing else is
+loaded: no ``description``, no ORM identity map, no attribute
+instrumentation. ``event_rows_stmt()`` replaces ``select(Event)`` in such
+queries and ``event_rows()`` runs it (``python -m
+invevent.benchmarks.read_models`` compares both).
+"""
+from sqlalchemy import select
+
+from .models import Event
+
+
+class EventRow:
+    """The columns of an event that list keyboards and maps need."""
+
+    __slots__ = (
+        "id", "owner_id", "title", "tags", "datetime_utc",
+        "location_txt", "latitude", "longitude", "address",
+    )
+
+    def __init__(self, id, owner_id, title, tags, datetime_utc, location_txt, latitude, longitude, address):
+        self.id = id
+        self.owner_id = owner_id
+        self.title = title
+        self.tags = tags
+        self.datetime_utc = datetime_utc
+        self.location_txt = location_txt
+        # latitude/longitude stay None for an address-only event until backfill_geocode runs
+        self.latitude = latitude
+        self.longitude = longitude
+        self.address = address
+
+    def __repr__(self) -> str:
+        return f"EventRow(id={self.id!r}, title={self.title!r}, datetime_utc={self.datetime_utc!r})"
+
+
+EVENT_ROW_COLUMNS = tuple(getattr(Event, name) for name in EventRow.__slots__)
+
+
+def event_rows_stmt():
+    """Return ``SELECT`` of the ``EventRow`` columns, to be filtered like ``select(Event)``."""
+    return select(*EVENT_ROW_COLUMNS)
+
+
+def event_rows(db, stmt) -> list:
+    """Execute ``stmt`` (built on ``event_rows_stmt()``) and return ``EventRow``s."""
+    return [EventRow(*row) for row in db.execute(stmt)]
+
+
+async def event_rows_async(db, stmt) -> list:
+    """``event_rows`` for an ``AsyncSession``."""
+    return [EventRow(*row) for row in await db.execute(stmt)]
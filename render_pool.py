@@ -0,0 +1,145 @@
+"""Process pool for CPU-bound map rendering.
+
+Static maps (tile compositing, PIL drawing, PNG encoding) and folium HTML are
+rendered in worker processes so a large map never blocks the handler thread.
+The caller gets a "Rendering map…" placeholder right away; the result is
+delivered from a callback once the worker finishes. At most
+``MAP_RENDER_QUEUE`` jobs may be pending, and a job that takes longer than
+``MAP_RENDER_TIMEOUT`` seconds is reported as timed out. The worker aborts
+it at the same deadline (``SIGALRM``), and the job keeps its queue slot
+until the worker has let go of it.
+"""
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .config import MAP_RENDER_WORKERS, MAP_RENDER_QUEUE, MAP_RENDER_TIMEOUT
+from .outbox import resolve
+
+log = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAP_RENDER_QUEUE)
+
+
+def start() -> None:
+    """Start the worker processes.
+
+    Called once before update handling begins so workers are forked while
+    the process is still single-threaded; ``submit`` starts the pool lazily
+    otherwise.
+    """
+    global _executor
+    if MAP_RENDER_WORKERS <= 0:
+        return
+    with _executor_lock:
+        if _executor is None:
+            ctx = None
+            if "fork" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("fork")
+            _executor = ProcessPoolExecutor(max_workers=MAP_RENDER_WORKERS, mp_context=ctx)
+            # warm up so the workers exist before handler threads start
+            for f in [_executor.submit(int) for _ in range(MAP_RENDER_WORKERS)]:
+                f.result()
+
+
+def shutdown() -> None:
+    """Stop the worker processes, cancelling jobs that have not started."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _run_until(deadline: float, fn, args):
+    """Worker side: run ``fn(*args)``, raising TimeoutError at ``deadline`` (epoch seconds)."""
+    left = deadline - time.time()
+    if left <= 0:
+        raise TimeoutError("render abandoned before it started")
+    if not hasattr(signal, "setitimer"):
+        return fn(*args)
+
+    def expired(_signo, _frame):
+        raise TimeoutError("render deadline passed")
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, left)
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _deliver(deliver, result) -> None:
+    try:
+        deliver(result)
+    except Exception:
+        log.exception("Failed to deliver rendered map")
+
+
+def submit(bot, chat_id: int, fn, args, deliver) -> bool:
+    """Run ``fn(*args)`` in the pool and pass its result to ``deliver``.
+
+    ``fn`` and ``args`` must be picklable. Returns False (after telling the
+    user) when too many renders are already pending.
+    """
+    if MAP_RENDER_WORKERS <= 0:
+        _deliver(deliver, fn(*args))
+        return True
+    if not _slots.acquire(blocking=False):
+        bot.send_message(chat_id, "Too many maps are being drawn right now, please try again in a moment.")
+        return False
+    start()
+    # edited or deleted below, so it must not be merged with other texts
+    placeholder = bot.send_message(chat_id, "Rendering map…", coalesce=False)
+    settled = threading.Lock()  # whoever acquires it first (result or timeout) wins
+
+    def drop_placeholder(text=None):
+        try:
+            message_id = resolve(placeholder, MAP_RENDER_TIMEOUT).message_id
+            if text:
+                bot.edit_message_text(text, chat_id, message_id)
+            else:
+                bot.delete_message(chat_id, message_id)
+        except Exception as e:
+            log.debug("Could not update render placeholder: %s", e)
+
+    def on_timeout():
+        if settled.acquire(blocking=False):
+            future.cancel()
+            log.warning("Map rendering timed out after %ss", MAP_RENDER_TIMEOUT)
+            drop_placeholder("Map rendering timed out, please try again.")
+
+    def on_done(fut):
+        # only now is the worker free again, even if the user was told of a timeout
+        _slots.release()
+        timer.cancel()
+        if not settled.acquire(blocking=False):
+            return
+        if fut.cancelled():
+            return
+        exc = fut.exception()
+        if exc is not None:
+            log.error("Map rendering failed: %s", exc)
+            drop_placeholder("Failed to draw the map.")
+            return
+        drop_placeholder()
+        _deliver(deliver, fut.result())
+
+    timer = threading.Timer(MAP_RENDER_TIMEOUT, on_timeout)
+    timer.daemon = True
+    try:
+        future = _executor.submit(_run_until, time.time() + MAP_RENDER_TIMEOUT, fn, args)
+    except Exception:
+        _slots.release()
+        drop_placeholder("Failed to draw the map.")
+        raise
+    timer.start()
+    future.add_done_callback(on_done)
+    return True
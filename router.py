@@ -0,0 +1,110 @@
+"""Indexed routing of messages and callback queries to handlers.
+
+Telebot evaluates every registered ``func=lambda m: ...`` predicate in turn
+until one matches, so dispatch cost grows with the number of menu buttons.
+``Router`` keeps message routes in a dict keyed by
+``(state, text, content_type)`` and callback routes keyed by the callback
+data prefix, so the matching handler is found with a few dict lookups.
+
+For a message the lookup order is:
+
+1. the exact button text in the user's current state;
+2. the exact button text in any state;
+3. any text/content of that type in the current state;
+4. any text/content of that type in any state;
+5. predicate fallbacks (e.g. the event wizard), in registration order.
+
+A handler returning ``ContinueHandling`` passes the message on to the next
+candidate, as with plain telebot handlers.
+"""
+import logging
+
+from telebot.handler_backends import ContinueHandling
+
+log = logging.getLogger(__name__)
+
+ANY = "*"
+
+
+class Router:
+    """Dict-based message and callback routing table."""
+
+    def __init__(self):
+        self._routes = {}
+        self._fallbacks = []
+        self._callbacks = {}
+        self._content_types = {"text"}
+
+    def message(self, text=None, states=None, content_types=("text",)):
+        """Decorator routing messages with ``text`` (None = any) in ``states`` (None = any)."""
+        def decorator(fn):
+            for state in states or (ANY,):
+                for ct in content_types:
+                    key = (state, text, ct)
+                    if key in self._routes and self._routes[key] is not fn:
+                        log.warning("Route %s registered twice; keeping %s", key, fn.__qualname__)
+                    self._routes[key] = fn
+            self._content_types.update(content_types)
+            return fn
+        return decorator
+
+    def fallback(self, func, content_types=("text",)):
+        """Decorator for a predicate route tried after all keyed routes."""
+        def decorator(fn):
+            self._fallbacks.append((func, frozenset(content_types), fn))
+            self._content_types.update(content_types)
+            return fn
+        return decorator
+
+    def callback(self, prefix: str):
+        """Decorator routing callback queries whose data starts with ``prefix:``."""
+        def decorator(fn):
+            self._callbacks[prefix] = fn
+            return fn
+        return decorator
+
+    def candidates(self, msg, state: str):
+        """Yield handlers for ``msg`` in lookup order."""
+        ct = msg.content_type
+        text = msg.text if ct == "text" else None
+        if text and text.startswith("/"):
+            # "/start payload" and "/start@BotName" route as "/start"
+            text = text.split(maxsplit=1)[0].split("@", 1)[0]
+        keys = []
+        if text is not None:
+            keys += [(state, text, ct), (ANY, text, ct)]
+        keys += [(state, None, ct), (ANY, None, ct)]
+        for key in keys:
+            handler = self._routes.get(key)
+            if handler is not None:
+                yield handler
+        for func, content_types, handler in self._fallbacks:
+            if ct in content_types and func(msg):
+                yield handler
+
+    def dispatch(self, msg, state: str) -> bool:
+        """Run the first handler for ``msg`` that does not continue; return True if one ran."""
+        for handler in self.candidates(msg, state):
+            if not isinstance(handler(msg), ContinueHandling):
+                return True
+        return False
+
+    def dispatch_callback(self, c) -> bool:
+        handler = self._callbacks.get((c.data or "").split(":", 1)[0])
+        if handler is None:
+            return False
+        handler(c)
+        return True
+
+    def install(self, bot, state_of) -> None:
+        """Register the router as the single message and callback handler of ``bot``.
+
+        ``state_of(user_id)`` returns the user's menu state.
+        """
+        bot.message_handler(func=lambda m: True, content_types=sorted(self._content_types))(
+            lambda m: self.dispatch(m, state_of(m.from_user.id))
+        )
+        bot.callback_query_handler(func=lambda c: True)(self.dispatch_callback)
+
+
+ROUTER = Router()
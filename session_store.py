@@ -0,0 +1,188 @@
+"""Per-user session state shared by the menus and the event wizard.
+
+State lives in a ``SessionStore`` split into namespaces (menu state, wizard
+progress, last location, ...). Two backends are available, selected by
+``STATE_BACKEND``:
+
+* ``memory`` — an in-process LRU bounded by ``STATE_MAX_ENTRIES``;
+* ``sql`` — the ``session_state`` table, so state survives restarts and is
+  shared by every bot process using the same database.
+
+Entries expire ``STATE_TTL`` seconds after their last write. Values must be
+JSON-serializable; ``datetime`` values are preserved.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import delete, select, tuple_
+
+from .config import STATE_BACKEND, STATE_TTL, STATE_MAX_ENTRIES
+from .database import SessionLocal
+from .models import SessionState
+
+log = logging.getLogger(__name__)
+
+
+def _encode(obj):
+    if isinstance(obj, datetime):
+        return {"__dt__": obj.isoformat()}
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _decode(obj):
+    if "__dt__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__dt__"])
+    return obj
+
+
+def dumps(value) -> str:
+    return json.dumps(value, default=_encode, ensure_ascii=False)
+
+
+def loads(raw: str):
+    return json.loads(raw, object_hook=_decode)
+
+
+class MemoryStore:
+    """In-process LRU with a TTL per entry."""
+
+    def __init__(self, ttl: float = STATE_TTL, max_entries: int = STATE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # (namespace, key) → (value, expires_at)
+        self._lock = threading.Lock()
+
+    def _get(self, k, now):
+        entry = self._data.get(k)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._data[k]
+            return None
+        self._data.move_to_end(k)
+        return entry
+
+    def get_many(self, namespace: str, keys) -> dict:
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._get((namespace, key), now)
+                if entry is not None:
+                    found[key] = entry[0]
+        return found
+
+    def set_many(self, namespace: str, items: dict) -> None:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            for key, value in items.items():
+                self._data[(namespace, key)] = (value, expires_at)
+                self._data.move_to_end((namespace, key))
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, namespace: str, key) -> None:
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+
+class SqlStore:
+    """Store backed by the ``session_state`` table."""
+
+    PURGE_EVERY = 256
+
+    def __init__(self, ttl: float = STATE_TTL, session_factory=SessionLocal):
+        self.ttl = ttl
+        self._session = session_factory
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, namespace: str, keys) -> dict:
+        by_str = {str(k): k for k in keys}
+        if not by_str:
+            return {}
+        with self._session() as db:
+            rows = db.execute(
+                select(SessionState.key, SessionState.value).where(
+                    SessionState.namespace == namespace,
+                    SessionState.key.in_(by_str),
+                    SessionState.expires_at > time.time(),
+                )
+            ).all()
+        return {by_str[key]: loads(value) for key, value in rows}
+
+    def set_many(self, namespace: str, items: dict) -> None:
+        if not items:
+            return
+        expires_at = time.time() + self.ttl
+        with self._session() as db:
+            for key, value in items.items():
+                db.merge(SessionState(namespace=namespace, key=str(key), value=dumps(value), expires_at=expires_at))
+            db.commit()
+        with self._lock:
+            self._writes += len(items)
+            purge = self._writes >= self.PURGE_EVERY
+            if purge:
+                self._writes = 0
+        if purge:
+            self.purge()
+
+    def delete(self, namespace: str, key) -> None:
+        with self._session() as db:
+            db.execute(delete(SessionState).where(
+                tuple_(SessionState.namespace, SessionState.key) == (namespace, str(key))
+            ))
+            db.commit()
+
+    def purge(self) -> int:
+        """Delete expired entries; return how many were removed."""
+        with self._session() as db:
+            n = db.execute(delete(SessionState).where(SessionState.expires_at <= time.time())).rowcount
+            db.commit()
+        log.debug("Purged %d expired session entries", n)
+        return n
+
+
+class Namespace:
+    """Dict-like view of one namespace of a store."""
+
+    def __init__(self, store, name: str):
+        self.store = store
+        self.name = name
+
+    def get(self, key, default=None):
+        return self.store.get_many(self.name, [key]).get(key, default)
+
+    def set(self, key, value) -> None:
+        self.store.set_many(self.name, {key: value})
+
+    def pop(self, key) -> None:
+        self.store.delete(self.name, key)
+
+    def get_many(self, keys) -> dict:
+        return self.store.get_many(self.name, keys)
+
+    def set_many(self, items: dict) -> None:
+        self.store.set_many(self.name, items)
+
+    def __contains__(self, key) -> bool:
+        return key in self.store.get_many(self.name, [key])
+
+
+def make_store(backend: str = STATE_BACKEND):
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "sql":
+        return SqlStore()
+    raise ValueError(f"Unknown STATE_BACKEND '{backend}' (expected 'memory' or 'sql')")
+
+
+STORE = make_store()
+
+
+def namespace(name: str) -> Namespace:
+    return Namespace(STORE, name)
@@ -0,0 +1,137 @@
+"""Disk-backed cache of OpenStreetMap tiles shared by all static map renders.
+
+Tiles are stored as one file per URL under ``MAP_TILE_CACHE_DIR``. Reads bump
+the file's mtime, and when the directory grows past ``MAP_TILE_CACHE_MB`` the
+least recently used tiles are deleted until it is back under 90% of the limit.
+
+All render worker processes write to the same directory, so each one
+re-measures the whole directory, under a file lock, after writing another
+1/20 of the limit or when its estimate passes the limit. The directory thus
+overshoots by at most about that much per worker.
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from staticmap import StaticMap
+
+from .config import MAP_TILE_CACHE_DIR, MAP_TILE_CACHE_MB
+
+log = logging.getLogger(__name__)
+
+
+class TileCache:
+    """Size-bounded LRU cache of tile images on disk, keyed by tile URL."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None  # directory size at the last measurement
+        self._written = 0  # bytes this process stored since then
+        self._lock = threading.Lock()
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + ".png")
+
+    def get(self, url: str):
+        """Return cached tile bytes for ``url`` or None."""
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return content
+
+    def put(self, url: str, content: bytes) -> None:
+        """Store tile bytes for ``url``, evicting old tiles if over the limit."""
+        path = self._path(url)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning("Failed to cache tile %s: %s", url, e)
+            return
+        with self._lock:
+            self._written += len(content)
+            if (self._size is not None and self._written < self.max_bytes // 20
+                    and self._size + self._written <= self.max_bytes):
+                return
+            with self._dir_lock():
+                self._size = self._evict()
+            self._written = 0
+
+    @contextlib.contextmanager
+    def _dir_lock(self):
+        """Hold an exclusive lock on the directory shared with the other processes."""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _files(self):
+        for root, _dirs, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".png"):  # the lock file and tiles still being written
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _evict(self) -> int:
+        """Delete least recently used tiles if the directory is over the limit; return its size."""
+        files = sorted(self._files())
+        total = sum(size for _mtime, size, _path in files)
+        if total <= self.max_bytes:
+            return total
+        target = int(self.max_bytes * 0.9)
+        for _mtime, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        return total
+
+
+TILE_CACHE = TileCache(MAP_TILE_CACHE_DIR, MAP_TILE_CACHE_MB * 1024 * 1024)
+
+
+class CachedStaticMap(StaticMap):
+    """``StaticMap`` that reads and writes tiles through ``TILE_CACHE``."""
+
+    def __init__(self, width, height, **kwargs):
+        kwargs.setdefault("headers", {"User-Agent": "invevent-bot"})
+        super().__init__(width, height, **kwargs)
+
+    def get(self, url, **kwargs):
+        content = TILE_CACHE.get(url)
+        if content is not None:
+            return 200, content
+        status, content = super().get(url, **kwargs)
+        if status == 200:
+            TILE_CACHE.put(url, content)
+        return status, content
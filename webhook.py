@@ -0,0 +1,89 @@
+"""Webhook ingestion mode.
+
+A small HTTP server receives updates from Telegram and hands them to the
+bot's ``LaneDispatcher`` (see ``dispatcher.py``). When the update's lane is
+full the server answers 503 and Telegram redelivers the update later, which
+is the backpressure signal. ``GET /metrics`` returns the dispatcher counters
+and the hit rates of the event-card and geocoding caches as JSON, plus the
+outbox counters when the bot has one.
+"""
+import json
+import logging
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+from . import event_cards, geocoding
+from .config import WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET
+
+log = logging.getLogger(__name__)
+
+
+def make_server(dispatcher, host: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT,
+                secret: str = WEBHOOK_SECRET, outbox=None) -> ThreadingHTTPServer:
+    """Return an HTTP server feeding posted updates into ``dispatcher``."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, body: bytes = b"", ctype: str = "text/plain") -> None:
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                stats = dispatcher.stats()
+                stats["event_cards"] = event_cards.cache_stats()
+                stats["geocoding"] = geocoding.cache_stats()
+                if outbox is not None:
+                    stats["outbox"] = outbox.stats()
+                self._reply(200, json.dumps(stats).encode(), "application/json")
+            else:
+                self._reply(404)
+
+        def do_POST(self):
+            if secret and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+                self._reply(403)
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                update = types.Update.de_json(self.rfile.read(length).decode("utf-8"))
+            except Exception:
+                self._reply(400)
+                return
+            self._reply(200 if dispatcher.submit(update) else 503)
+
+        def log_message(self, fmt, *args):
+            log.debug("webhook: " + fmt, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def run_webhook(bot, url: str = WEBHOOK_URL) -> None:
+    """Register ``url`` with Telegram and serve updates until SIGTERM/SIGINT.
+
+    ``bot`` must be a ``DispatchingTeleBot``.
+    """
+    server = make_server(bot.dispatcher, outbox=getattr(bot, "outbox", None))
+    if url:
+        bot.set_webhook(url=url, secret_token=WEBHOOK_SECRET)
+    stop = threading.Event()
+
+    def _on_signal(_signo, _frame):
+        stop.set()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, _on_signal)
+
+    serve = threading.Thread(target=server.serve_forever, name="webhook-server", daemon=True)
+    serve.start()
+    log.info("Webhook server listening on %s:%s", *server.server_address)
+    stop.wait()
+    log.info("Shutting down webhook server, draining %s", bot.dispatcher.stats())
+    server.shutdown()
+    server.server_close()
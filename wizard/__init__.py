@@ -1,3 +1,3 @@
 # wizard/__init__.py
 
-from .wizard import start, get, reset
+from .wizard import start, get, reset, save
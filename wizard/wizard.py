@@ -1,10 +1,12 @@
 # wizard/wizard.py
 
 """
-Simple in-memory wizard state for each user.
+Wizard state for each user, kept in the session store.
 Tracks which step (0..5) the user is on.
 """
 
+from ..session_store import namespace
+
 STEPS = [
     "topic",
     "event",
@@ -15,14 +17,14 @@ STEPS = [
 ]
 
 # { user_id: {"step": int, …other keys…} }
-WIZ = {}
+WIZ = namespace("wizard")
 
 def start(uid):
     """
     Initialize a wizard session for user `uid`. 
     Puts them at step index 0.
     """
-    WIZ[uid] = {"step": 0}
+    WIZ.set(uid, {"step": 0})
 
 def get(uid):
     """
@@ -34,4 +36,10 @@ def reset(uid):
     """
     Cancel and remove this user’s wizard‐state.
     """
-    WIZ.pop(uid, None)
+    WIZ.pop(uid)
+
+def save(uid, w):
+    """
+    Store the (modified) wizard-state dict `w` of user `uid`.
+    """
+    WIZ.set(uid, w)
@@ -1,7 +1,8 @@
 # wizard/wizard_dispatcher.py
 
 from telebot import types
-from .wizard import get as wiz_get, reset as wiz_reset
+from .wizard import get as wiz_get, reset as wiz_reset, save as wiz_save
+from ..router import ROUTER
 from .steps.step0_topic import handle as handle_step0
 from .steps.step1_event import handle as handle_step1
 from .steps.step2_datetime import handle as handle_step2
@@ -21,11 +22,11 @@ step_handlers = {
 
 def register_dispatcher(bot):
     """
-    Registers one message_handler that fires whenever wiz_get(uid) != None. 
+    Registers one fallback route that fires whenever wiz_get(uid) != None
+    and no menu button matched.
     Then it does a “cancel” check, and finally dispatches to the proper step.
     """
-    # @bot.message_handler(func=lambda m: wiz_get(m.from_user.id) is not None)
-    @bot.message_handler(
+    @ROUTER.fallback(
         func=lambda m: wiz_get(m.from_user.id) is not None,
         content_types=['text', 'location', 'venue', 'photo']
     )
@@ -47,6 +48,9 @@ def register_dispatcher(bot):
         handler = step_handlers.get(step)
         if handler:
             handler(bot, m, w)
+            # Persist the step's changes unless it finished or cancelled the wizard
+            if wiz_get(user_id) is not None:
+                wiz_save(user_id, w)
         else:
             # If for some reason step is out of range, reset and inform user
             wiz_reset(user_id)
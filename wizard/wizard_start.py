@@ -3,13 +3,14 @@
 from telebot import types
 from .wizard import start as wiz_start
 from .wizard_utils import TOPICS
+from ..router import ROUTER
 
 def register_start(bot):
     """
     Registers the “➕ Create event” entry‐point. 
     Puts user at step 0 (topic selection) and sends the first keyboard.
     """
-    @bot.message_handler(func=lambda m: m.text == "➕ Create event")
+    @ROUTER.message("➕ Create event")
     def start_event(m):
         user_id = m.from_user.id
         wiz_start(user_id)